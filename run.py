@@ -1,11 +1,15 @@
+import argparse
 import sys
 import yaml
 import os
 import random
+import uuid
 import numpy as np
 from typing import Dict, Any
 
+from src.orchestrator.budget import RunBudget
 from src.orchestrator.graph import build_agent_graph, save_outputs
+from src.utils.profiling import NodeProfiler
 
 
 def load_config() -> Dict[str, Any]:
@@ -24,14 +28,27 @@ def set_seeds(seed: int):
     np.random.seed(seed)
     # Add other library seeds (e.g., torch) if needed
 
+def parse_args():
+    """Parses the CLI query and per-run budget overrides."""
+    parser = argparse.ArgumentParser(
+        description="Agentic Facebook Ads analyst.",
+        epilog="Example: python run.py 'Analyze ROAS drop in last 7 days' --max-latency 30",
+    )
+    parser.add_argument("query", help="Natural-language analysis query.")
+    parser.add_argument("--max-latency", type=float, default=None,
+                        help="Per-run wall-time budget in seconds (overrides config).")
+    parser.add_argument("--max-tokens", type=int, default=None,
+                        help="Per-run LLM token budget (overrides config).")
+    parser.add_argument("--speculative", action="store_true",
+                        help="Generate creatives speculatively, in parallel with insights/evaluation.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile each graph node (cProfile + tracemalloc) into reports/profile/.")
+    return parser.parse_args()
+
 def main():
     # Get user query from CLI
-    if len(sys.argv) < 2:
-        print("Usage: python src/run.py '<your_query>'")
-        print("Example: python src/run.py 'Analyze ROAS drop in last 7 days'")
-        sys.exit(1)
-    
-    user_query = sys.argv[1]
+    args = parse_args()
+    user_query = args.query
     print(f"---  STARTING AGENTIC FB ANALYST ---")
     print(f"Query: {user_query}")
     
@@ -39,32 +56,60 @@ def main():
     config = load_config()
     set_seeds(config["system"]["random_seed"])
 
+    # CLI budget flags take precedence over config
+    config.setdefault("budget", {})
+    if args.max_latency is not None:
+        config["budget"]["max_latency_s"] = args.max_latency
+    if args.max_tokens is not None:
+        config["budget"]["max_tokens"] = args.max_tokens
+    if args.speculative:
+        config.setdefault("orchestration", {})["speculative_creatives"] = True
+
     # Create directories if they don't exist
     os.makedirs(config["paths"]["reports"], exist_ok=True)
     os.makedirs(config["paths"]["logs"], exist_ok=True)
 
+    # Profiling is opt-in: nodes are only wrapped when --profile is set
+    profiler = None
+    if args.profile:
+        profiler = NodeProfiler(os.path.join(config["paths"]["reports"], "profile"))
+
     # Build the agentic graph
-    app = build_agent_graph(config)
+    app = build_agent_graph(config, profiler)
+    budget = RunBudget.from_config(config)
     
     # Define the initial state
     initial_state = {
+        "run_id": uuid.uuid4().hex,
         "user_query": user_query,
         "plan": [],
         "full_data": None,
         "data_summary": None,
+        "summary_sections": {},
+        "insight_tasks": [],
+        "hypothesis_batches": [],
         "hypotheses": [],
         "validated_insights": [],
         "low_ctr_campaigns": [],
+        "fatigued_creatives": [],
+        "baselines": {},
+        "creative_retry": True,
         "creative_recommendations": [],
-        "log": []
+        "log": [],
+        "budget": budget,
+        "degradations": [],
+        "speculation": None
     }
     
-    # Run the graph
+    # Run the graph (the callback meters token usage of every LLM call)
     print("---  EXECUTING AGENT GRAPH ---")
-    final_state = app.invoke(initial_state)
+    final_state = app.invoke(initial_state, config={"callbacks": [budget.callback]})
     
     # Save the final outputs
-    save_outputs(final_state, config)
+    if profiler is not None:
+        profiler.wrap("save_outputs", save_outputs)(final_state, config)
+    else:
+        save_outputs(final_state, config)
     
     print("---  ANALYSIS COMPLETE ---")
 
@@ -1,10 +1,12 @@
-from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import pandas as pd
 
 from src.orchestrator.graph_state import AgentState
-from src.utils.llm import get_llm
+from src.utils.llm import get_llm_from_config
+from src.utils.prompts import get_prompt
+from src.analytics.backend import get_backend
+from src.analytics.near_duplicates import MinHashLSH, load_or_build_index
 
 class CreativeSet(BaseModel):
     """New creative recommendations for a single campaign."""
@@ -17,20 +19,82 @@ class CreativeList(BaseModel):
     """List of creative recommendations."""
     recommendations: List[CreativeSet]
 
-def get_creative_agent(config: dict):
-    """Returns the creative improvement generator node."""
+def get_creative_generator(config: dict):
+    """Returns a function that generates creative sets for a list of campaigns."""
     
-    llm = get_llm(
-        model_name=config["llm"]["model_name"],
-        temperature=0.7 # Higher temp for creativity
-    ).with_structured_output(CreativeList)
+    # Higher temp for creativity
+    llm = get_llm_from_config(config, temperature=0.7).with_structured_output(CreativeList)
     
-    prompt_template = ChatPromptTemplate.from_template(
-        _load_prompt_template(config["paths"]["prompts"], "creative_prompt.md")
-    )
+    prompt_template = get_prompt(config, "creative_prompt.md")
     
     creative_chain = prompt_template | llm
     
+    dedup_cfg = config["analysis"].get("creative_dedup", {})
+
+    def invoke(insights: str, campaigns: List[str], backend, fatigued_creatives, rejected) -> List[Dict[str, Any]]:
+        # Get existing creative messages for context [cite: 8]
+        existing_creatives = backend.distinct(
+            ['campaign_name', 'creative_message', 'ctr'], {'campaign_name': campaigns}
+        ).to_string()
+
+        response = creative_chain.invoke({
+            "insights": insights,
+            "campaign_list": str(campaigns),
+            "existing_creatives": existing_creatives,
+            "fatigued_creatives": _format_fatigued(fatigued_creatives, campaigns),
+            "rejected_creatives": _format_rejected(rejected),
+        })
+        return [r.dict() for r in response.recommendations]
+
+    def generate(insights: str, low_ctr_campaigns: List[str], df: pd.DataFrame,
+                 fatigued_creatives: Optional[List[Dict[str, Any]]] = None,
+                 regenerate: bool = True) -> List[Dict[str, Any]]:
+        """
+        Runs the creative chain for the given campaigns and insights, minus near-duplicate copy.
+        Campaigns left without headlines or messages are regenerated once (unless
+        `regenerate` is False, e.g. when the budget cannot cover a second call) and
+        dropped if they are still incomplete.
+        """
+        backend = get_backend(config, df)
+        fatigued_creatives = fatigued_creatives or []
+        recommendations = invoke(insights, low_ctr_campaigns, backend, fatigued_creatives, [])
+        if not dedup_cfg.get("enabled", True):
+            return recommendations
+
+        corpus = backend.distinct(['creative_message'])['creative_message'].dropna().astype(str).tolist()
+        index = load_or_build_index(
+            corpus, config["paths"].get("cache", "cache/"),
+            num_perm=dedup_cfg.get("num_perm", 128), bands=dedup_cfg.get("bands", 32),
+            shingle_size=dedup_cfg.get("shingle_size", 5),
+        )
+        threshold = dedup_cfg.get("threshold", 0.7)
+        recommendations, rejected = _drop_near_duplicates(recommendations, index, threshold)
+
+        incomplete = [r['campaign_name'] for r in recommendations if not _is_complete(r)]
+        if incomplete and regenerate and dedup_cfg.get("regenerate", True):
+            print(f"Creative Agent: All headlines or messages rejected as near-duplicates for {incomplete}; regenerating once.")
+            retry = invoke(insights, incomplete, backend, fatigued_creatives, rejected)
+            # Kept copy goes first, so the retry is filtered against it rather than the other way round
+            complete = [r for r in recommendations if _is_complete(r)]
+            filtered, retry_rejected = _drop_near_duplicates(complete + retry, index, threshold)
+            by_campaign = {r['campaign_name']: r for r in filtered}
+            recommendations = [by_campaign.get(r['campaign_name'], r) for r in recommendations]
+            rejected += retry_rejected
+
+        if rejected:
+            print(f"Creative Agent: Rejected {len(rejected)} near-duplicate headline(s)/message(s).")
+        dropped = [r['campaign_name'] for r in recommendations if not _is_complete(r)]
+        if dropped:
+            print(f"Creative Agent: Dropping creative sets left without headlines or messages for {dropped}.")
+        return [r for r in recommendations if _is_complete(r)]
+
+    return generate
+
+def get_creative_agent(config: dict, generate=None):
+    """Returns the creative improvement generator node."""
+    
+    generate = generate or get_creative_generator(config)
+    
     def creative_node(state: AgentState) -> AgentState:
         """Generates new creative ideas."""
         print("---  EXECUTING CREATIVE AGENT ---")
@@ -41,19 +105,10 @@ def get_creative_agent(config: dict):
             print("Creative Agent: No low-CTR campaigns identified.")
             return state
             
-        # Get existing creative messages for context [cite: 8]
-        df = state["full_data"]
-        existing_creatives = df[df['campaign_name'].isin(low_ctr_campaigns)][
-            ['campaign_name', 'creative_message', 'ctr']
-        ].drop_duplicates().to_string()
-
-        response = creative_chain.invoke({
-            "insights": str(state["validated_insights"]),
-            "campaign_list": str(low_ctr_campaigns),
-            "existing_creatives": existing_creatives
-        })
-        
-        recommendations = [r.dict() for r in response.recommendations]
+        recommendations = generate(
+            str(state["validated_insights"]), low_ctr_campaigns, state["full_data"],
+            state.get("fatigued_creatives", []), regenerate=state.get("creative_retry", True)
+        )
         state["creative_recommendations"] = recommendations
         print(f"Creative Agent: Generated {len(recommendations)} creative sets.")
         
@@ -61,11 +116,40 @@ def get_creative_agent(config: dict):
 
     return creative_node
 
-def _load_prompt_template(path: str, filename: str) -> str:
-    """Helper to load prompt templates from files."""
-    try:
-        with open(f"{path}{filename}", "r") as f:
-            return f.read()
-    except FileNotFoundError:
-        print(f"Error: Prompt file not found at {path}{filename}")
-        return ""
\ No newline at end of file
+def _format_fatigued(fatigued_creatives: List[Dict[str, Any]], campaigns: List[str]) -> str:
+    """One line per fatiguing creative that runs in one of the given campaigns."""
+    lines = [
+        f"- [{', '.join(c for c in f['campaigns'] if c in campaigns)}] \"{f['creative_message']}\" "
+        f"({f['creative_type']}): CTR decaying {f['recent_decay_rate']:.1%}/day, "
+        f"up from {f['early_decay_rate']:.1%}/day"
+        for f in fatigued_creatives
+        if any(c in campaigns for c in f['campaigns'])
+    ]
+    return "\n".join(lines) or "None detected."
+
+def _drop_near_duplicates(recommendations: List[Dict[str, Any]], index: MinHashLSH,
+                          threshold: float) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Removes headlines and messages that near-copy a historical creative message
+    or another candidate (across all campaigns). Returns (recommendations, rejected).
+    """
+    rejected = []
+    for field in ('new_headlines', 'new_messages'):
+        owners = [i for i, r in enumerate(recommendations) for _ in r[field]]
+        candidates = [text for r in recommendations for text in r[field]]
+        keep, dropped = index.filter(candidates, threshold)
+        for r in recommendations:
+            r[field] = []
+        for owner, text, kept in zip(owners, candidates, keep):
+            if kept:
+                recommendations[owner][field].append(text)
+        rejected += [dict(d, field=field) for d in dropped]
+    return recommendations, rejected
+
+def _is_complete(recommendation: Dict[str, Any]) -> bool:
+    return bool(recommendation['new_headlines']) and bool(recommendation['new_messages'])
+
+def _format_rejected(rejected: List[Dict[str, Any]]) -> str:
+    """One line per rejected candidate and the copy it duplicated."""
+    lines = [f"- \"{r['text']}\" (too similar to \"{r['similar_to']}\")" for r in rejected]
+    return "\n".join(lines) or "None."
@@ -1,6 +1,19 @@
 import pandas as pd
 from src.orchestrator.graph_state import AgentState
-from typing import Dict, Any
+from src.analytics.backend import get_backend, add_kpis, pivot_periods, period_windows
+from src.analytics.fatigue import CREATIVE_KEYS, fit_fatigue_curves
+from src.analytics.contribution import RATIO_KPIS, decompose_change
+from src.analytics.baseline import BASELINE_DIMENSIONS, fit_baselines
+from src.agents.evaluator_agent import DIMENSION_LABELS
+from typing import Dict, Any, List
+
+# Default insight groups: group -> dimensions whose findings go into its summary section
+INSIGHT_GROUPS = {
+    'campaigns': ['campaign_name', 'adset_name'],
+    'audiences': ['audience_type'],
+    'platforms': ['platform', 'country'],
+    'creatives': ['creative_type', 'creative_message'],
+}
 
 class DataAgent:
     def __init__(self, config: dict):
@@ -11,11 +24,34 @@ class DataAgent:
             else config["paths"]["full_data"]
         )
         self.low_ctr_top_n = config["analysis"].get("creative_gen_top_n", 3)
+        self.backend_name = config.get("analytics", {}).get("backend", "pandas")
+        fatigue_cfg = dict(config["analysis"].get("fatigue", {}))
+        self.fatigue_top_n = fatigue_cfg.pop("top_n", 5)
+        self.fatigue_params = fatigue_cfg
+        contribution_cfg = config["analysis"].get("contribution", {})
+        self.contribution_dimensions = contribution_cfg.get("dimensions", ['campaign_name', 'audience_type'])
+        self.contribution_top_n = contribution_cfg.get("top_n", 5)
+        baseline_cfg = config["analysis"].get("baseline", {})
+        self.baseline_dimensions = baseline_cfg.get("dimensions", BASELINE_DIMENSIONS)
+        self.baseline_min_history_days = baseline_cfg.get("min_history_days", 14)
+        self.baseline_top_n = baseline_cfg.get("top_n", 5)
+        # Segment groups the insight stage fans out over; the summary gets one section per group
+        self.insight_groups = config["analysis"].get("insights", {}).get("groups", INSIGHT_GROUPS)
 
     def load_data_node(self, state: AgentState) -> AgentState:
         """Loads the dataset."""
         print("---  EXECUTING DATA AGENT (LOAD) ---")
         state["log"].append("Data Agent: Loading data.")
+        if self.backend_name == "duckdb":
+            # Out-of-core: the export is queried in place, never materialized
+            try:
+                backend = get_backend(self.config)
+                state["full_data"] = None
+                print(f"Data Agent: Querying {backend.row_count()} rows in place from {self.data_path} (DuckDB).")
+            except Exception as e:
+                print(f"Data Agent: Error opening data: {e}")
+                state["log"].append(f"Data Agent: Error opening data: {e}")
+            return state
         try:
             df = pd.read_csv(self.data_path)
             # --- Critical Preprocessing ---
@@ -44,121 +80,182 @@ class DataAgent:
         """
         print("---  EXECUTING DATA AGENT (SUMMARIZE) ---")
         state["log"].append("Data Agent: Summarizing data for insights.")
-        df = state["full_data"]
+        backend = get_backend(self.config, state["full_data"])
         query = state["user_query"]
         
         # --- 1. Define Time Periods ---
         # We'll hardcode "last 7 days" analysis based on the sample query.
         # A more complex agent would parse the query (e.g., "last 30 days").
         
-        # Ensure data is sorted by date
-        df = df.sort_values('date')
-        
-        if df.empty:
+        if backend.is_empty():
             state["data_summary"] = "Error: No data loaded."
             return state
 
-        max_date = df['date'].max()
-        
         # Define current and previous periods
-        current_period_end = max_date
-        current_period_start = max_date - pd.Timedelta(days=6)
-        previous_period_end = current_period_start - pd.Timedelta(days=1)
-        previous_period_start = previous_period_end - pd.Timedelta(days=6)
+        periods = period_windows(backend.max_date(), 7)
+        current_period_start, current_period_end = periods['current']
+        previous_period_start, previous_period_end = periods['previous']
 
-        df_current = df[
-            (df['date'] >= current_period_start) & (df['date'] <= current_period_end)
-        ]
-        df_previous = df[
-            (df['date'] >= previous_period_start) & (df['date'] <= previous_period_end)
-        ]
+        # --- 2. Calculate KPIs (Overall) ---
+        overall = add_kpis(backend.period_totals([], periods)).set_index('period')
 
-        if df_current.empty:
+        if 'current' not in overall.index:
             state["data_summary"] = f"Error: No data found for the current period ({current_period_start.date()} to {current_period_end.date()})."
             return state
-        if df_previous.empty:
+        if 'previous' not in overall.index:
             state["data_summary"] = f"Error: No data found for the previous period ({previous_period_start.date()} to {previous_period_end.date()}) to compare against."
             return state
 
-        # --- 2. Calculate KPIs (Overall) ---
-        kpis_current = self._calculate_kpis(df_current)
-        kpis_previous = self._calculate_kpis(df_previous)
+        kpis_current = overall.loc['current']
+        kpis_previous = overall.loc['previous']
 
         # --- 3. Calculate Segmented KPIs (Campaigns & Audiences) ---
         
         # By Campaign
-        campaign_kpis_current = df_current.groupby('campaign_name').apply(self._calculate_kpis)
-        campaign_kpis_previous = df_previous.groupby('campaign_name').apply(self._calculate_kpis)
-        campaign_comparison = campaign_kpis_current.join(
-            campaign_kpis_previous, lsuffix='_current', rsuffix='_previous', how='outer'
-        ).fillna(0)
+        campaign_comparison = self._period_comparison(backend, 'campaign_name', periods)
         campaign_comparison['roas_change_pct'] = (
             (campaign_comparison['roas_current'] - campaign_comparison['roas_previous']) / 
              campaign_comparison['roas_previous']
         )
         # Filter for campaigns with meaningful spend
-        campaign_comparison = campaign_comparison[campaign_comparison['spend_current'] > 50]
-        worst_campaigns = campaign_comparison.sort_values('roas_change_pct').head(3)
+        significant_spend = campaign_comparison[campaign_comparison['spend_current'] > 50]
+        worst_campaigns = significant_spend.sort_values('roas_change_pct').head(3)
 
         # By Audience
-        audience_kpis_current = df_current.groupby('audience_type').apply(self._calculate_kpis)
-        audience_kpis_previous = df_previous.groupby('audience_type').apply(self._calculate_kpis)
-        audience_comparison = audience_kpis_current.join(
-            audience_kpis_previous, lsuffix='_current', rsuffix='_previous', how='outer'
-        ).fillna(0)
+        audience_comparison = self._period_comparison(backend, 'audience_type', periods)
         audience_comparison['ctr_change_pct'] = (
             (audience_comparison['ctr_current'] - audience_comparison['ctr_previous']) / 
              audience_comparison['ctr_previous']
         )
         # Filter for audiences with meaningful impressions
-        audience_comparison = audience_comparison[audience_comparison['impressions_current'] > 1000]
-        worst_audiences = audience_comparison.sort_values('ctr_change_pct').head(3)
+        significant_audiences = audience_comparison[audience_comparison['impressions_current'] > 1000]
+        worst_audiences = significant_audiences.sort_values('ctr_change_pct').head(3)
         
-        # --- 4. Identify Low-CTR Campaigns for Creative Gen ---
+        # --- 4. Mix vs. Rate Decomposition of the Overall Changes ---
+        # Reuses the (unfiltered) step 3 comparisons, so each dimension is aggregated once
+        computed = {'campaign_name': campaign_comparison, 'audience_type': audience_comparison}
+        comparisons = {
+            dimension: computed[dimension] if dimension in computed
+            else self._period_comparison(backend, dimension, periods)
+            for dimension in self.contribution_dimensions
+        }
+        contributions = {
+            kpi: {dimension: decompose_change(comparison, kpi) for dimension, comparison in comparisons.items()}
+            for kpi in RATIO_KPIS
+        }
+
+        # --- 5. Expected Baselines (trend + day-of-week) for the Current Window ---
+        baselines = {
+            dimension: fit_baselines(
+                backend.daily_totals([dimension]), [dimension], periods['current'],
+                min_history_days=self.baseline_min_history_days,
+            ).set_index(dimension)
+            for dimension in self.baseline_dimensions
+        }
+        state["baselines"] = baselines
+
+        # --- 6. Creative Fatigue Curves ---
+        fatigued_creatives = self._fatigued_creatives(backend, periods)
+        state["fatigued_creatives"] = fatigued_creatives
+
+        # --- 7. Identify Low-CTR Campaigns for Creative Gen ---
         # This is a separate task: find lowest CTR in *current* period 
-        campaign_ctr_current = campaign_kpis_current.sort_values('ctr')
+        campaign_ctr_current = campaign_comparison.sort_values('ctr_current')
         # Filter for campaigns with enough impressions to be significant
-        significant_campaigns = campaign_ctr_current[campaign_ctr_current['impressions'] > 1000]
-        low_ctr_campaigns_list = significant_campaigns.head(self.low_ctr_top_n).index.tolist()
+        significant_campaigns = campaign_ctr_current[campaign_ctr_current['impressions_current'] > 1000]
+        # Campaigns running creatives with accelerating fatigue go first
+        fatigue_campaigns = [
+            c for c in dict.fromkeys(c for f in fatigued_creatives for c in f['campaigns'])
+            if c in significant_campaigns.index
+        ]
+        low_ctr_campaigns_list = (
+            fatigue_campaigns + [c for c in significant_campaigns.index if c not in fatigue_campaigns]
+        )[:self.low_ctr_top_n]
         
         state["low_ctr_campaigns"] = low_ctr_campaigns_list
 
-        # --- 5. Format the Text Summary ---
-        summary_lines = []
-        summary_lines.append(f"Analysis for query: '{query}'")
-        summary_lines.append(f"Period Analyzed: {current_period_start.date()} to {current_period_end.date()} (vs. {previous_period_start.date()} to {previous_period_end.date()})\n")
-
-        summary_lines.append("--- Overall Performance ---")
-        summary_lines.append(self._format_kpi_comparison(kpis_current, kpis_previous))
-
-        summary_lines.append("\n--- Top Campaign ROAS Decliners ---")
-        if worst_campaigns.empty:
-            summary_lines.append("No significant campaign ROAS declines found.")
-        else:
-            for name, row in worst_campaigns.iterrows():
-                summary_lines.append(
-                    f"- **{name}**: ROAS dropped by **{row['roas_change_pct']:.1%}** "
-                    f"(from {row['roas_previous']:.2f} to {row['roas_current']:.2f}). "
-                    f"Spend: ${row['spend_current']:.0f}. "
-                    f"CTR: {row['ctr_current']:.4f}."
-                )
+        # --- 8. Format the Text Summary ---
+        # A shared overview plus one section per insight group (each feeds its own insight call)
+        overview_lines = []
+        overview_lines.append(f"Analysis for query: '{query}'")
+        overview_lines.append(f"Period Analyzed: {current_period_start.date()} to {current_period_end.date()} (vs. {previous_period_start.date()} to {previous_period_end.date()})\n")
 
-        summary_lines.append("\n--- Top Audience CTR Decliners (Potential Fatigue) ---")
-        if worst_audiences.empty:
-            summary_lines.append("No significant audience CTR declines found.")
-        else:
-            for name, row in worst_audiences.iterrows():
-                summary_lines.append(
-                    f"- **{name}**: CTR dropped by **{row['ctr_change_pct']:.1%}** "
-                    f"(from {row['ctr_previous']:.4f} to {row['ctr_current']:.4f}). "
-                    f"Spend: ${row['spend_current']:.0f}. "
-                    f"ROAS: {row['roas_current']:.2f}."
-                )
+        overview_lines.append("--- Overall Performance ---")
+        overview_lines.append(self._format_kpi_comparison(kpis_current, kpis_previous))
+
+        overview_lines.append("\n--- What Drove the Change: Mix (Share Shifts) vs. Rate (Segment Performance) ---")
+        for kpi in RATIO_KPIS:
+            overview_lines.append(
+                self._format_contribution_split(kpi, kpis_previous[kpi], kpis_current[kpi], contributions[kpi])
+            )
+
+        sections = {}
+        for group, dimensions in self.insight_groups.items():
+            summary_lines = []
+            if 'campaign_name' in dimensions:
+                summary_lines.append("\n--- Top Campaign ROAS Decliners ---")
+                if worst_campaigns.empty:
+                    summary_lines.append("No significant campaign ROAS declines found.")
+                else:
+                    for name, row in worst_campaigns.iterrows():
+                        summary_lines.append(
+                            f"- **{name}**: ROAS dropped by **{row['roas_change_pct']:.1%}** "
+                            f"(from {row['roas_previous']:.2f} to {row['roas_current']:.2f}). "
+                            f"Spend: ${row['spend_current']:.0f}. "
+                            f"CTR: {row['ctr_current']:.4f}."
+                            f"{self._format_baseline_z(baselines, 'campaign_name', name, 'roas')}"
+                        )
+
+            if 'audience_type' in dimensions:
+                summary_lines.append("\n--- Top Audience CTR Decliners (Potential Fatigue) ---")
+                if worst_audiences.empty:
+                    summary_lines.append("No significant audience CTR declines found.")
+                else:
+                    for name, row in worst_audiences.iterrows():
+                        summary_lines.append(
+                            f"- **{name}**: CTR dropped by **{row['ctr_change_pct']:.1%}** "
+                            f"(from {row['ctr_previous']:.4f} to {row['ctr_current']:.4f}). "
+                            f"Spend: ${row['spend_current']:.0f}. "
+                            f"ROAS: {row['roas_current']:.2f}."
+                            f"{self._format_baseline_z(baselines, 'audience_type', name, 'ctr')}"
+                        )
+
+            contributor_lines = [
+                line for kpi in RATIO_KPIS
+                for line in self._format_contributors(kpi, contributions[kpi], dimensions)
+            ]
+            if contributor_lines:
+                summary_lines.append("\n--- Top Contributors to the Change (Mix vs. Rate) ---")
+                summary_lines.extend(contributor_lines)
+
+            if any(d in baselines for d in dimensions):
+                summary_lines.append("\n--- Below Expected Baseline (Trend + Day-of-Week; z = Std. Errors from Expected) ---")
+                summary_lines.extend(self._format_below_baseline(baselines, dimensions))
 
-        summary_lines.append(f"\n--- Low-CTR Campaigns Identified for Creative Review ---")
-        summary_lines.append(f"{', '.join(low_ctr_campaigns_list)}")
+            if any(key in dimensions for key in CREATIVE_KEYS):
+                summary_lines.append("\n--- Creatives with Accelerating CTR Decay (Creative Fatigue) ---")
+                if not fatigued_creatives:
+                    summary_lines.append("No creatives with accelerating fatigue found.")
+                else:
+                    for f in fatigued_creatives:
+                        summary_lines.append(
+                            f"- **{f['creative_message']}** ({f['creative_type']}, {f['days_active']} days): "
+                            f"CTR now decaying **{f['recent_decay_rate']:.1%}/day** "
+                            f"(vs {f['early_decay_rate']:.1%}/day earlier). "
+                            f"Campaigns: {', '.join(f['campaigns'])}."
+                        )
 
-        final_summary = "\n".join(summary_lines)
+            if 'campaign_name' in dimensions:
+                summary_lines.append(f"\n--- Low-CTR Campaigns Identified for Creative Review ---")
+                summary_lines.append(f"{', '.join(low_ctr_campaigns_list)}")
+
+            sections[group] = "\n".join(summary_lines).strip()
+
+        overview = "\n".join(overview_lines)
+        state["summary_sections"] = {"overview": overview, **sections}
+        final_summary = "\n\n".join(
+            [overview] + [f"=== {group.title()} ===\n{section}" for group, section in sections.items()]
+        )
         state["data_summary"] = final_summary
         
         print("Data Agent: Summary generated.")
@@ -166,40 +263,94 @@ class DataAgent:
         
         return state
 
-    def _calculate_kpis(self, df: pd.DataFrame) -> pd.Series:
-        """Helper function to aggregate KPIs from a dataframe."""
-        if df.empty:
-            return pd.Series(index=self._kpi_names(), data=[0]*len(self._kpi_names()))
+    def _fatigued_creatives(self, backend, periods: dict) -> list:
+        """
+        Fits decay curves for every creative over the full history and returns
+        the still-running ones whose decay is accelerating, worst first.
+        """
+        curves = fit_fatigue_curves(backend.daily_totals(CREATIVE_KEYS), **self.fatigue_params)
+        fatigued = curves[curves['accelerating']]
+        if fatigued.empty:
+            return []
 
-        spend = df['spend'].sum()
-        revenue = df['revenue'].sum()
-        purchases = df['purchases'].sum()
-        clicks = df['clicks'].sum()
-        impressions = df['impressions'].sum()
-        
-        roas = revenue / spend if spend > 0 else 0
-        ctr = clicks / impressions if impressions > 0 else 0
-        cpc = spend / clicks if clicks > 0 else 0
-        cpa = spend / purchases if purchases > 0 else 0
-        cr = purchases / clicks if clicks > 0 else 0 # Conversion Rate (Purchases / Clicks)
-        
-        return pd.Series({
-            'spend': spend,
-            'revenue': revenue,
-            'purchases': purchases,
-            'clicks': clicks,
-            'impressions': impressions,
-            'roas': roas,
-            'ctr': ctr,
-            'cpc': cpc,
-            'cpa': cpa,
-            'cr': cr
-        })
-
-    def _kpi_names(self) -> list:
-        """Helper for empty series creation."""
-        return ['spend', 'revenue', 'purchases', 'clicks', 'impressions',
-                'roas', 'ctr', 'cpc', 'cpa', 'cr']
+        # Only creatives still running in the current period, with their campaigns
+        running = backend.period_totals(['campaign_name'] + CREATIVE_KEYS, {'current': periods['current']})
+        campaigns = running.groupby(CREATIVE_KEYS, sort=False)['campaign_name'].agg(sorted).reset_index()
+        fatigued = fatigued.merge(campaigns, on=CREATIVE_KEYS).head(self.fatigue_top_n)
+        columns = CREATIVE_KEYS + ['days_active', 'ctr', 'early_decay_rate', 'recent_decay_rate', 'campaign_name']
+        return [
+            {**row, 'campaigns': row.pop('campaign_name')}
+            for row in fatigued[columns].to_dict('records')
+        ]
+
+    def _format_contribution_split(self, kpi: str, previous: float, current: float,
+                                   effects: Dict[str, pd.DataFrame]) -> str:
+        """One KPI's overall change with its mix/rate split per dimension."""
+        fmt = ".4f" if kpi == 'ctr' else ".2f"
+        splits = [
+            f"{DIMENSION_LABELS.get(dimension, dimension)} mix {frame['mix_effect'].sum():+{fmt}} / "
+            f"rate {frame['rate_effect'].sum():+{fmt}}"
+            for dimension, frame in effects.items()
+        ]
+        return (
+            f"- **{kpi.upper()}** {previous:{fmt}} -> {current:{fmt}} ({current - previous:+{fmt}}). "
+            f"Split by dimension: {'; '.join(splits)}."
+        )
+
+    def _format_contributors(self, kpi: str, effects: Dict[str, pd.DataFrame], dimensions: List[str]) -> list:
+        """The segments of `dimensions` contributing most to one KPI's change."""
+        fmt = ".4f" if kpi == 'ctr' else ".2f"
+        weight = RATIO_KPIS[kpi][1]
+        segments = [
+            frame.head(self.contribution_top_n).assign(label=DIMENSION_LABELS.get(dimension, dimension))
+            for dimension, frame in effects.items() if dimension in dimensions
+        ]
+        if not segments:
+            return []
+        top = pd.concat(segments)
+        top = top.iloc[top['total_effect'].abs().to_numpy().argsort(kind='stable')[::-1]].head(self.contribution_top_n)
+        return [
+            f"- {row['label']} **{name}**: {row['total_effect']:+{fmt}} {kpi.upper()} "
+            f"(rate {row['rate_effect']:+{fmt}}: {kpi.upper()} {row[f'{kpi}_previous']:{fmt}} -> {row[f'{kpi}_current']:{fmt}}; "
+            f"mix {row['mix_effect']:+{fmt}}: {weight} share {row['share_previous']:.1%} -> {row['share_current']:.1%})"
+            for name, row in top.iterrows()
+        ]
+
+    def _format_baseline_z(self, baselines: Dict[str, pd.DataFrame], dimension: str, name: str, kpi: str) -> str:
+        """' Vs. baseline: ...' suffix for a segment, or '' when it has no baseline."""
+        if dimension not in baselines or name not in baselines[dimension].index:
+            return ""
+        row = baselines[dimension].loc[name]
+        if pd.isna(row[f'{kpi}_z']):
+            return ""
+        fmt = ".4f" if kpi == 'ctr' else ".2f"
+        return f" Vs. baseline: expected {row[f'{kpi}_expected']:{fmt}}, z = {row[f'{kpi}_z']:+.1f}."
+
+    def _format_below_baseline(self, baselines: Dict[str, pd.DataFrame], dimensions: List[str]) -> list:
+        """The segments of `dimensions` furthest below their expected ROAS / CTR."""
+        frames = {d: frame for d, frame in baselines.items() if d in dimensions}
+        lines = []
+        for kpi in RATIO_KPIS:
+            fmt = ".4f" if kpi == 'ctr' else ".2f"
+            scored = pd.concat([
+                frame[[f'{kpi}_actual', f'{kpi}_expected', f'{kpi}_z']].assign(label=DIMENSION_LABELS.get(dimension, dimension))
+                for dimension, frame in frames.items()
+            ]) if frames else pd.DataFrame()
+            below = scored[scored[f'{kpi}_z'] < 0].sort_values(f'{kpi}_z').head(self.baseline_top_n) if not scored.empty else scored
+            if below.empty:
+                lines.append(f"- {kpi.upper()}: no segments below their expected baseline.")
+                continue
+            for name, row in below.iterrows():
+                lines.append(
+                    f"- {row['label']} **{name}** {kpi.upper()}: {row[f'{kpi}_actual']:{fmt}} vs. expected "
+                    f"{row[f'{kpi}_expected']:{fmt}} (z = {row[f'{kpi}_z']:+.1f})"
+                )
+        return lines
+
+    def _period_comparison(self, backend, dimension: str, periods: dict) -> pd.DataFrame:
+        """KPIs per segment of `dimension` as `<kpi>_current` / `<kpi>_previous` columns."""
+        totals = backend.period_totals([dimension], periods)
+        return pivot_periods(totals, [dimension], list(periods))
 
     def _format_kpi_comparison(self, current: pd.Series, previous: pd.Series) -> str:
         """Helper to create a summary string for a single set of KPIs."""
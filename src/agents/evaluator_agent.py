@@ -1,77 +1,82 @@
 import pandas as pd
 import re
 from src.orchestrator.graph_state import AgentState
-from typing import Dict, Any, List, Optional
+from src.analytics.backend import AnalyticsBackend, get_backend, pivot_periods, period_windows
+from typing import Dict, Any, List, Optional, Tuple
+
+# Volume column guarding each metric against noise in tiny segments
+VOLUME_GUARDS = {
+    'roas': 'spend', 'cpc': 'spend', 'cpa': 'spend', 'spend': 'spend', 'revenue': 'spend',
+    'cr': 'clicks', 'purchases': 'clicks',
+    'ctr': 'impressions', 'clicks': 'impressions', 'impressions': 'impressions',
+}
+
+DIMENSION_LABELS = {
+    'campaign_name': 'Campaign', 'adset_name': 'Adset', 'audience_type': 'Audience',
+    'platform': 'Platform', 'country': 'Country', 'creative_type': 'Creative type',
+    'creative_message': 'Creative',
+}
 
 class EvaluatorAgent:
     def __init__(self, config: dict):
         self.config = config
         self.min_confidence = config["analysis"]["min_confidence_threshold"]
+        # Minimum relative change (per metric) that counts as a significant move
+        self.change_thresholds = {"roas": 0.20, "ctr": 0.15, "default": 0.10}
+        self.change_thresholds.update(config["analysis"].get("change_thresholds", {}))
+        # Minimum current-period volume before a segment is judged
+        self.min_volume = {"spend": 50, "impressions": 1000, "clicks": 50}
+        self.min_volume.update(config["analysis"].get("min_volume", {}))
+        # Minimum |z| vs. the expected baseline (when one exists) to confirm a move
+        self.baseline_z = config["analysis"].get("baseline", {}).get("z_threshold", 2.0)
 
     def evaluate_node(self, state: AgentState) -> AgentState:
         """
         Quantitatively validates each hypothesis against the full dataset.
+        Hypothesis specs are compiled into one batched plan: each distinct
+        (dimension, window) pair is aggregated once, and every hypothesis is
+        checked against those aggregates.
         """
         print("---  EXECUTING EVALUATOR AGENT ---")
         state["log"].append("Evaluator Agent: Validating hypotheses.")
-        
-        df = state["full_data"]
+
+        backend = get_backend(self.config, state["full_data"])
+        baselines = state.get("baselines") or {}
         hypotheses: List[Dict[str, Any]] = state["hypotheses"]
         validated_insights = []
-        
-        if df.empty:
+
+        if backend.is_empty():
             print("Evaluator Agent: No data found, skipping evaluation.")
             return state
-            
-        # --- 1. Define Time Periods (same logic as DataAgent) ---
-        max_date = df['date'].max()
-        current_period_end = max_date
-        current_period_start = max_date - pd.Timedelta(days=6)
-        previous_period_end = current_period_start - pd.Timedelta(days=1)
-        previous_period_start = previous_period_end - pd.Timedelta(days=6)
-
-        df_current = df[
-            (df['date'] >= current_period_start) & (df['date'] <= current_period_end)
-        ]
-        df_previous = df[
-            (df['date'] >= previous_period_start) & (df['date'] <= previous_period_end)
-        ]
 
-        # --- 2. Loop through and validate each hypothesis ---
+        # --- 1. Resolve a spec for every hypothesis ---
+        specs: List[Optional[Dict[str, Any]]] = []
         for hypo in hypotheses:
-            hypothesis_text = hypo["hypothesis"].lower()
-            print(f"Evaluator: Checking hypothesis: \"{hypo['hypothesis']}\"")
-            
             # Reset confidence and evidence
             hypo['confidence'] = 0.1  # Default to low confidence
             hypo['evidence'] = "NOT VALIDATED"
-            
-            try:
-                # --- 3. Routing Logic ---
-                # Route to the correct validation function based on keywords
-                
-                # Check for campaign ROAS drop
-                if "campaign" in hypothesis_text and "roas" in hypothesis_text:
-                    # Try to extract campaign name
-                    name = self._extract_entity(hypo['hypothesis'], df['campaign_name'].unique())
-                    if name:
-                        hypo = self._validate_campaign_roas_drop(hypo, name, df_current, df_previous)
-                    else:
-                        hypo['evidence'] = "Could not identify a valid campaign name in hypothesis."
-
-                # Check for audience CTR drop (fatigue)
-                elif ("audience" in hypothesis_text and "ctr" in hypothesis_text) or "fatigue" in hypothesis_text:
-                    # Try to extract audience name
-                    name = self._extract_entity(hypo['hypothesis'], df['audience_type'].unique())
-                    if name:
-                        hypo = self._validate_audience_ctr_drop(hypo, name, df_current, df_previous)
-                    else:
-                        hypo['evidence'] = "Could not identify a valid audience name in hypothesis."
-                
-                else:
-                    hypo['evidence'] = "No specific validation logic found for this hypothesis type."
-                    print(f"  -> SKIPPED: No validation logic.")
+            spec = hypo.get('spec')
+            if not spec:
+                spec, reason = self._infer_spec(hypo['hypothesis'], backend)
+                if spec is None:
+                    hypo['evidence'] = reason
+            specs.append(spec)
+
+        # --- 2. Compile and execute the batched plan ---
+        plan = self._compile_plan([s for s in specs if s])
+        results = self._execute_plan(plan, backend)
 
+        # --- 3. Check each hypothesis against the shared aggregates ---
+        for hypo, spec in zip(hypotheses, specs):
+            print(f"Evaluator: Checking hypothesis: \"{hypo['hypothesis']}\"")
+            if spec is None:
+                print(f"  -> SKIPPED: {hypo['evidence']}")
+                continue
+            try:
+                result = results[(spec['dimension'], _window_days(spec))]
+                if isinstance(result, Exception):
+                    raise result
+                hypo = self._check_spec(hypo, spec, result, baselines)
             except Exception as e:
                 print(f"  -> ERROR validating hypothesis: {e}")
                 hypo['evidence'] = f"Error during validation: {e}"
@@ -88,93 +93,146 @@ class EvaluatorAgent:
         print(f"Evaluator Agent: Validated {len(validated_insights)} insights.")
         return state
 
+    def _infer_spec(self, text: str, backend: AnalyticsBackend) -> Tuple[Optional[Dict[str, Any]], str]:
+        """
+        Fallback for hypotheses without a spec: routes on keywords, as the
+        evaluator did before specs existed. Returns (spec, reason-if-none).
+        """
+        hypothesis_text = text.lower()
+        # Check for campaign ROAS drop
+        if "campaign" in hypothesis_text and "roas" in hypothesis_text:
+            dimension, metric = 'campaign_name', 'roas'
+        # Check for audience CTR drop (fatigue)
+        elif ("audience" in hypothesis_text and "ctr" in hypothesis_text) or "fatigue" in hypothesis_text:
+            dimension, metric = 'audience_type', 'ctr'
+        else:
+            return None, "No specific validation logic found for this hypothesis type."
+
+        label = DIMENSION_LABELS[dimension].lower()
+        try:
+            entities = backend.distinct([dimension])[dimension].tolist()
+        except Exception:
+            entities = []
+        name = self._extract_entity(text, entities)
+        if not name:
+            return None, f"Could not identify a valid {label} name in hypothesis."
+        return {
+            'metric': metric, 'dimension': dimension, 'entity': name,
+            'window_days': 7, 'expected_direction': 'decrease',
+        }, ""
+
     def _extract_entity(self, text: str, entity_list: List[str]) -> Optional[str]:
-        """Finds the first matching entity from a list in the text."""
-        for entity in entity_list:
-            if re.search(re.escape(entity), text, re.IGNORECASE):
-                return entity
+        """Finds the first matching entity from a list in the text (case-exact matches first)."""
+        for flags in (0, re.IGNORECASE):
+            for entity in entity_list:
+                if re.search(re.escape(entity), text, flags):
+                    return entity
         return None
 
-    def _calculate_kpis_for_segment(self, df: pd.DataFrame) -> pd.Series:
-        """Aggregates KPIs for a pre-filtered dataframe."""
-        if df.empty:
-            return pd.Series({'spend': 0, 'revenue': 0, 'clicks': 0, 'impressions': 0, 'roas': 0, 'ctr': 0})
-        
-        spend = df['spend'].sum()
-        revenue = df['revenue'].sum()
-        clicks = df['clicks'].sum()
-        impressions = df['impressions'].sum()
-        
-        roas = revenue / spend if spend > 0 else 0
-        ctr = clicks / impressions if impressions > 0 else 0
-        
-        return pd.Series({
-            'spend': spend, 'revenue': revenue, 'clicks': clicks, 
-            'impressions': impressions, 'roas': roas, 'ctr': ctr
-        })
-
-    def _validate_campaign_roas_drop(self, hypo: Dict[str, Any], campaign_name: str, 
-                                     df_current: pd.DataFrame, df_previous: pd.DataFrame) -> Dict[str, Any]:
-        """Checks for a significant ROAS drop for a specific campaign."""
-        
-        kpi_current = self._calculate_kpis_for_segment(df_current[df_current['campaign_name'] == campaign_name])
-        kpi_previous = self._calculate_kpis_for_segment(df_previous[df_previous['campaign_name'] == campaign_name])
-        
-        # Check 1: Must have meaningful spend
-        if kpi_current['spend'] < 50:
-            hypo['evidence'] = f"REJECTED: Campaign '{campaign_name}' has insufficient spend (${kpi_current['spend']:.0f}) in the current period."
-            return hypo
-            
-        # Check 2: Previous ROAS must be valid
-        if kpi_previous['roas'] == 0:
-            hypo['evidence'] = f"REJECTED: Campaign '{campaign_name}' had 0 ROAS in the previous period."
+    def _compile_plan(self, specs: List[Dict[str, Any]]) -> Dict[Tuple[str, int], set]:
+        """Groups specs into the distinct (dimension, window_days) aggregations needed."""
+        plan: Dict[Tuple[str, int], set] = {}
+        for spec in specs:
+            key = (spec['dimension'], _window_days(spec))
+            plan.setdefault(key, set()).add(spec['entity'])
+        return plan
+
+    def _execute_plan(self, plan: Dict[Tuple[str, int], set], backend: AnalyticsBackend) -> Dict[Tuple[str, int], Any]:
+        """
+        Runs one grouped aggregation per plan entry (errors are kept per entry).
+        Each returns one row per segment with `<kpi>_current` / `<kpi>_previous` columns.
+        """
+        results = {}
+        max_date = backend.max_date() if plan else None
+        for (dimension, window_days) in plan:
+            try:
+                periods = period_windows(max_date, window_days)
+                totals = backend.period_totals([dimension], periods)
+                results[(dimension, window_days)] = pivot_periods(totals, [dimension], list(periods))
+            except Exception as e:
+                results[(dimension, window_days)] = e
+        return results
+
+    def _check_spec(self, hypo: Dict[str, Any], spec: Dict[str, Any], result: pd.DataFrame,
+                    baselines: Optional[Dict[str, pd.DataFrame]] = None) -> Dict[str, Any]:
+        """
+        Checks one hypothesis spec against the aggregated segment table and,
+        where the segment has one, its expected baseline for the current window.
+        """
+        metric, dimension = spec['metric'], spec['dimension']
+        label = DIMENSION_LABELS.get(dimension, dimension)
+        metric_label = metric.upper()
+
+        # Match the entity exactly, else case-insensitively, against the segment index
+        matches = [e for e in result.index if e == spec['entity']] or [
+            e for e in result.index if str(e).lower() == str(spec['entity']).lower()
+        ]
+        if not matches:
+            hypo['evidence'] = f"REJECTED: {label} '{spec['entity']}' has no data in the analyzed windows."
             return hypo
-        
-        # Check 3: ROAS must have dropped significantly
-        roas_change_pct = (kpi_current['roas'] - kpi_previous['roas']) / kpi_previous['roas']
-        
-        if roas_change_pct < -0.20: # At least a 20% drop
-            hypo['confidence'] = 0.9
-            hypo['evidence'] = (
-                f"CONFIRMED: '{campaign_name}' ROAS dropped by **{roas_change_pct:.1%}** "
-                f"(from {kpi_previous['roas']:.2f} to {kpi_current['roas']:.2f})."
-            )
-        else:
+        entity = matches[0]
+        row = result.loc[entity]
+
+        # Check 1: Must have meaningful volume
+        volume_col = VOLUME_GUARDS[metric]
+        volume = row[f"{volume_col}_current"]
+        if volume < self.min_volume[volume_col]:
             hypo['evidence'] = (
-                f"REJECTED: '{campaign_name}' ROAS change ({roas_change_pct:.1%}) was not a significant drop. "
-                f"(from {kpi_previous['roas']:.2f} to {kpi_current['roas']:.2f})."
+                f"REJECTED: {label} '{entity}' has insufficient {volume_col} ({volume:,.0f}) in the current period."
             )
-        return hypo
-
-    def _validate_audience_ctr_drop(self, hypo: Dict[str, Any], audience_name: str, 
-                                    df_current: pd.DataFrame, df_previous: pd.DataFrame) -> Dict[str, Any]:
-        """Checks for a significant CTR drop (fatigue) for a specific audience."""
-        
-        kpi_current = self._calculate_kpis_for_segment(df_current[df_current['audience_type'] == audience_name])
-        kpi_previous = self._calculate_kpis_for_segment(df_previous[df_previous['audience_type'] == audience_name])
-
-        # Check 1: Must have meaningful impressions
-        if kpi_current['impressions'] < 1000:
-            hypo['evidence'] = f"REJECTED: Audience '{audience_name}' has insufficient impressions ({kpi_current['impressions']:.0f}) in the current period."
             return hypo
 
-        # Check 2: Previous CTR must be valid
-        if kpi_previous['ctr'] == 0:
-            hypo['evidence'] = f"REJECTED: Audience '{audience_name}' had 0 CTR in the previous period."
+        # Check 2: Previous value must be valid
+        current = row[f"{metric}_current"]
+        previous = row[f"{metric}_previous"]
+        if previous == 0:
+            hypo['evidence'] = f"REJECTED: {label} '{entity}' had 0 {metric_label} in the previous period."
             return hypo
-            
-        # Check 3: CTR must have dropped significantly
-        ctr_change_pct = (kpi_current['ctr'] - kpi_previous['ctr']) / kpi_previous['ctr']
-        
-        if ctr_change_pct < -0.15: # At least a 15% drop
-            hypo['confidence'] = 0.9
+
+        # Check 3: Metric must have moved significantly in the expected direction
+        change_pct = (current - previous) / previous
+        threshold = self.change_thresholds.get(metric, self.change_thresholds["default"])
+        expected_decrease = spec['expected_direction'] == 'decrease'
+        moved = change_pct < -threshold if expected_decrease else change_pct > threshold
+        fmt = ".4f" if metric in ('ctr', 'cr') else ".2f"
+        values = f"(from {previous:{fmt}} to {current:{fmt}})"
+
+        if not moved:
             hypo['evidence'] = (
-                f"CONFIRMED: Audience '{audience_name}' CTR dropped by **{ctr_change_pct:.1%}** "
-                f"(from {kpi_previous['ctr']:.4f} to {kpi_current['ctr']:.4f}), indicating fatigue."
+                f"REJECTED: {label} '{entity}' {metric_label} change ({change_pct:.1%}) was not a significant "
+                f"{spec['expected_direction']}. {values}."
             )
-        else:
+            return hypo
+
+        # Check 4: The move must stand out from the segment's expected baseline
+        verb = "dropped" if expected_decrease else "rose"
+        z = self._baseline_z(baselines or {}, spec, entity)
+        if z is not None and not (z <= -self.baseline_z if expected_decrease else z >= self.baseline_z):
             hypo['evidence'] = (
-                f"REJECTED: Audience '{audience_name}' CTR change ({ctr_change_pct:.1%}) was not a significant drop. "
-                f"(from {kpi_previous['ctr']:.4f} to {kpi_current['ctr']:.4f})."
+                f"REJECTED: {label} '{entity}' {metric_label} {verb} by {change_pct:.1%} {values}, but is "
+                f"within its expected range for the period (baseline z = {z:+.1f})."
             )
-        return hypo
\ No newline at end of file
+            return hypo
+
+        hypo['confidence'] = 0.9
+        hypo['evidence'] = f"CONFIRMED: {label} '{entity}' {metric_label} {verb} by **{change_pct:.1%}** {values}."
+        if z is not None:
+            hypo['evidence'] += f" Baseline z = {z:+.1f}."
+        return hypo
+
+    def _baseline_z(self, baselines: Dict[str, pd.DataFrame], spec: Dict[str, Any], entity: str) -> Optional[float]:
+        """The segment's actual-vs-expected z for the spec's metric, if a baseline covers it."""
+        frame = baselines.get(spec['dimension'])
+        column = f"{spec['metric']}_z"
+        # Baselines score the Data Agent's 7-day current window
+        if frame is None or column not in frame.columns or _window_days(spec) != 7:
+            return None
+        if entity not in frame.index or pd.isna(frame.at[entity, column]):
+            return None
+        return float(frame.at[entity, column])
+
+
+def _window_days(spec: Dict[str, Any]) -> int:
+    """The spec's current-window length; missing means 7, and a zero or negative value from the model is clamped to 1."""
+    window_days = spec.get('window_days')
+    return 7 if window_days is None else max(int(window_days), 1)
@@ -1,9 +1,26 @@
-from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel,Field
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Literal, Optional
 
 from src.orchestrator.graph_state import AgentState
-from src.utils.llm import get_llm
+from src.utils.llm import get_llm_from_config
+from src.utils.prompts import get_prompt
+from src.analytics.near_duplicates import normalize_text
+
+class HypothesisSpec(BaseModel):
+    """Machine-readable check the Evaluator runs to validate a hypothesis."""
+    metric: Literal[
+        "roas", "ctr", "cr", "cpc", "cpa", "spend", "revenue", "impressions", "clicks", "purchases"
+    ] = Field(description="The KPI the hypothesis is about.")
+    dimension: Literal[
+        "campaign_name", "adset_name", "audience_type", "platform", "country", "creative_type", "creative_message"
+    ] = Field(description="The column that identifies the segment.")
+    entity: str = Field(description="The exact segment value as it appears in the summary, e.g. a campaign name.")
+    window_days: int = Field(
+        default=7, description="Length in days (at least 1) of the current window (compared against the window before it)."
+    )
+    expected_direction: Literal["decrease", "increase"] = Field(
+        description="How the metric is expected to have moved in the current window."
+    )
 
 class Hypothesis(BaseModel):
     """A single hypothesis explaining a performance change."""
@@ -14,48 +31,115 @@ class Hypothesis(BaseModel):
     data_needed_for_validation: str = Field(
         description="What data or query is needed to validate this?"
     )
+    spec: Optional[HypothesisSpec] = Field(
+        default=None, description="Structured validation spec for this hypothesis."
+    )
 
 class HypothesisList(BaseModel):
     """A list of hypotheses."""
     hypotheses: List[Hypothesis]
 
 def get_insight_agent(config: dict):
-    """Returns the insight agent node."""
-    
-    llm = get_llm(
-        model_name=config["llm"]["model_name"],
-        temperature=config["llm"]["temperature"]
-    ).with_structured_output(HypothesisList)
-    
-    prompt_template = ChatPromptTemplate.from_template(
-        _load_prompt_template(config["paths"]["prompts"], "insight_prompt.md")
-    )
-    
-    insight_chain = prompt_template | llm
+    """
+    Returns the insight agent node (the map step).
+    It splits the data summary into one task per segment group; the graph fans
+    the tasks out to concurrent `insight_branch` calls and `merge_insights` reduces them.
+    """
     
     def insight_node(state: AgentState) -> AgentState:
-        """Generates hypotheses from data summary."""
+        """Prepares one insight task per segment group."""
         print("--- EXECUTING INSIGHT AGENT ---")
         state["log"].append("Insight Agent: Generating hypotheses.")
         
-        response = insight_chain.invoke({
-            "query": state["user_query"],
-            "data_summary": state["data_summary"]
-        })
-        print("response------->",response)
-        hypotheses_list = [h.dict() for h in response.hypotheses]
-        state["hypotheses"] = hypotheses_list
-        print(f"Insight Agent: Generated {len(hypotheses_list)} hypotheses.")
+        sections = dict(state.get("summary_sections") or {})
+        overview = sections.pop("overview", "")
+        tasks = [
+            {"group": group, "data_summary": f"{overview}\n\n=== {group.title()} ===\n{section}"}
+            for group, section in sections.items() if section
+        ]
+        # No sections (e.g. the summary is an error message): one call over the whole summary
+        state["insight_tasks"] = tasks or [{"group": "all", "data_summary": state["data_summary"]}]
+        print(f"Insight Agent: Fanning out {len(state['insight_tasks'])} insight call(s): "
+              f"{', '.join(t['group'] for t in state['insight_tasks'])}.")
         
         return state
 
     return insight_node
 
-def _load_prompt_template(path: str, filename: str) -> str:
-    """Helper to load prompt templates from files."""
-    try:
-        with open(f"{path}{filename}", "r") as f:
-            return f.read()
-    except FileNotFoundError:
-        print(f"Error: Prompt file not found at {path}{filename}")
-        return ""
\ No newline at end of file
+def get_insight_branch(config: dict):
+    """Returns the insight branch node, which generates hypotheses for one segment group."""
+    
+    llm = get_llm_from_config(config).with_structured_output(HypothesisList)
+    
+    prompt_template = get_prompt(config, "insight_prompt.md")
+    
+    insight_chain = prompt_template | llm
+    hypotheses_per_group = config["analysis"].get("insights", {}).get("hypotheses_per_group", "1-3")
+    
+    def insight_branch(task: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Runs concurrently with the other groups' branches. A failure is recorded
+        in the branch's batch instead of failing the whole insight step.
+        """
+        group = task["group"]
+        print(f"--- EXECUTING INSIGHT AGENT ({group.upper()}) ---")
+        try:
+            response = insight_chain.invoke({
+                "query": task["user_query"],
+                "focus": "All segments." if group == "all" else f"The {group} section of the summary.",
+                "n_hypotheses": "3-5" if group == "all" else hypotheses_per_group,
+                "data_summary": task["data_summary"],
+            })
+            hypotheses = [{**h.dict(), "group": group} for h in response.hypotheses]
+            print(f"Insight Agent ({group}): Generated {len(hypotheses)} hypotheses.")
+            batch = {"group": group, "hypotheses": hypotheses, "error": None}
+        except Exception as e:
+            print(f"Insight Agent ({group}): Error generating hypotheses: {e}")
+            batch = {"group": group, "hypotheses": [], "error": repr(e)}
+        return {"hypothesis_batches": [batch]}
+
+    return insight_branch
+
+def get_insight_merger(config: dict):
+    """Returns the reduce node that merges, deduplicates and ranks the branches' hypotheses."""
+    
+    max_hypotheses = config["analysis"].get("insights", {}).get("max_hypotheses", 8)
+    
+    def merge_insights_node(state: AgentState) -> AgentState:
+        """Keeps the highest-confidence copy of each distinct hypothesis, best first."""
+        print("--- EXECUTING INSIGHT AGENT (MERGE) ---")
+        
+        # Batches arrive in completion order; rank ties by the groups' configured order
+        order = {task["group"]: i for i, task in enumerate(state.get("insight_tasks") or [])}
+        batches = sorted(state.get("hypothesis_batches") or [], key=lambda b: order.get(b["group"], len(order)))
+        for batch in batches:
+            if batch["error"]:
+                state["log"].append(f"Insight Agent: '{batch['group']}' branch failed: {batch['error']}")
+        
+        candidates = sorted(
+            (h for batch in batches for h in batch["hypotheses"]),
+            key=lambda h: h.get("confidence", 0), reverse=True
+        )
+        merged = {}
+        for hypo in candidates:
+            merged.setdefault(_dedup_key(hypo), hypo)
+        state["hypotheses"] = list(merged.values())[:max_hypotheses]
+        
+        failed = [b["group"] for b in batches if b["error"]]
+        print(
+            f"Insight Agent: Merged {len(candidates)} hypotheses from {len(batches) - len(failed)} group(s) "
+            f"into {len(state['hypotheses'])}" + (f" (failed: {', '.join(failed)})." if failed else ".")
+        )
+        return state
+
+    return merge_insights_node
+
+def _dedup_key(hypo: Dict[str, Any]) -> tuple:
+    """Hypotheses checking the same spec (or, without one, saying the same thing) are duplicates."""
+    spec = hypo.get("spec")
+    if spec:
+        return (
+            spec["metric"], spec["dimension"], str(spec["entity"]).lower(),
+            spec.get("window_days") or 7, spec["expected_direction"],
+        )
+    return (normalize_text(hypo["hypothesis"]),)
@@ -1,9 +1,9 @@
-from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel,Field
 from typing import List
 
 from src.orchestrator.graph_state import AgentState
-from src.utils.llm import get_llm
+from src.utils.llm import get_llm_from_config
+from src.utils.prompts import get_prompt
 
 class Plan(BaseModel):
     """The multi-step plan to diagnose ad performance."""
@@ -14,14 +14,9 @@ class Plan(BaseModel):
 def get_planner_agent(config: dict):
     """Returns the planner agent node."""
     
-    llm = get_llm(
-        model_name=config["llm"]["model_name"],
-        temperature=config["llm"]["temperature"]
-    ).with_structured_output(Plan)
+    llm = get_llm_from_config(config).with_structured_output(Plan)
     
-    prompt_template = ChatPromptTemplate.from_template(
-        _load_prompt_template(config["paths"]["prompts"], "planner_prompt.md")
-    )
+    prompt_template = get_prompt(config, "planner_prompt.md")
     
     planner_chain = prompt_template | llm
     
@@ -37,12 +32,3 @@ def get_planner_agent(config: dict):
         return state
 
     return planner_node
-
-def _load_prompt_template(path: str, filename: str) -> str:
-    """Helper to load prompt templates from files."""
-    try:
-        with open(f"{path}{filename}", "r") as f:
-            return f.read()
-    except FileNotFoundError:
-        print(f"Error: Prompt file not found at {path}{filename}")
-        return "" # Should handle this more gracefully
\ No newline at end of file
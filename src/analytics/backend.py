@@ -0,0 +1,245 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Additive columns every KPI is derived from
+BASE_COLUMNS = ['spend', 'revenue', 'purchases', 'clicks', 'impressions']
+
+# (start, end) dates, both inclusive
+Period = Tuple[pd.Timestamp, pd.Timestamp]
+
+
+class AnalyticsBackend(ABC):
+    """
+    Aggregation interface shared by the Data and Evaluator agents.
+    Backends only ever return small, pre-aggregated frames; KPI ratios
+    are derived from the summed BASE_COLUMNS by `add_kpis`.
+    """
+
+    @abstractmethod
+    def is_empty(self) -> bool:
+        """True if the dataset has no rows."""
+
+    @abstractmethod
+    def max_date(self) -> pd.Timestamp:
+        """Latest date in the dataset."""
+
+    @abstractmethod
+    def period_totals(self, dimensions: List[str], periods: Dict[str, Period]) -> pd.DataFrame:
+        """
+        Sums BASE_COLUMNS per segment of `dimensions` and per labelled period.
+        Returns a long frame with columns `dimensions + ['period'] + BASE_COLUMNS`;
+        segments without rows in a period are absent.
+        """
+
+    @abstractmethod
+    def daily_totals(self, dimensions: List[str]) -> pd.DataFrame:
+        """
+        Sums BASE_COLUMNS per segment of `dimensions` and per day.
+        Returns a long frame with columns `dimensions + ['date'] + BASE_COLUMNS`.
+        """
+
+    @abstractmethod
+    def distinct(self, columns: List[str], filters: Optional[Dict[str, list]] = None) -> pd.DataFrame:
+        """Distinct combinations of `columns`, optionally restricted to rows where column IN values."""
+
+
+class PandasBackend(AnalyticsBackend):
+    """In-memory backend over the DataFrame loaded by the Data Agent (default)."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+
+    def is_empty(self) -> bool:
+        return self.df is None or self.df.empty
+
+    def max_date(self) -> pd.Timestamp:
+        return self.df['date'].max()
+
+    def period_totals(self, dimensions: List[str], periods: Dict[str, Period]) -> pd.DataFrame:
+        dates = self.df['date']
+        conditions = [(dates >= start) & (dates <= end) for start, end in periods.values()]
+        labels = np.select(conditions, list(periods), default='')
+        mask = labels != ''
+        frame = self.df.loc[mask, dimensions + BASE_COLUMNS].assign(period=labels[mask])
+        totals = frame.groupby(dimensions + ['period'], sort=False, dropna=False)[BASE_COLUMNS].sum()
+        return totals.reset_index()
+
+    def daily_totals(self, dimensions: List[str]) -> pd.DataFrame:
+        totals = self.df.groupby(dimensions + ['date'], sort=False, dropna=False)[BASE_COLUMNS].sum()
+        return totals.reset_index()
+
+    def distinct(self, columns: List[str], filters: Optional[Dict[str, list]] = None) -> pd.DataFrame:
+        frame = self.df
+        for column, values in (filters or {}).items():
+            frame = frame[frame[column].isin(values)]
+        return frame[columns].drop_duplicates().reset_index(drop=True)
+
+
+class DuckDBBackend(AnalyticsBackend):
+    """
+    Embedded DuckDB backend that queries the CSV/Parquet export in place.
+    DuckDB scans the file with multiple threads and spills to `temp_directory`
+    once `memory_limit` is reached, so exports larger than RAM still aggregate.
+    Type coercion mirrors the Data Agent's pandas preprocessing.
+    """
+
+    def __init__(self, data_path: str, threads: Optional[int] = None,
+                 memory_limit: Optional[str] = None, temp_directory: Optional[str] = None):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError(
+                "analytics.backend is 'duckdb' but the duckdb package is not installed (pip install duckdb)."
+            ) from e
+
+        self.data_path = data_path
+        self.con = duckdb.connect()
+        if threads:
+            self.con.execute(f"SET threads TO {int(threads)}")
+        if memory_limit:
+            self.con.execute(f"SET memory_limit = '{memory_limit}'")
+        if temp_directory:
+            os.makedirs(temp_directory, exist_ok=True)
+            self.con.execute(f"SET temp_directory = '{temp_directory}'")
+
+        if data_path.endswith(".parquet"):
+            source = f"read_parquet('{data_path}')"
+        else:
+            source = f"read_csv('{data_path}', header = true, all_varchar = true)"
+        numeric = ", ".join(
+            f"COALESCE(TRY_CAST({col} AS DOUBLE), 0) AS {col}" for col in BASE_COLUMNS
+        )
+        self.con.execute(f"""
+            CREATE OR REPLACE VIEW ads_typed AS
+            SELECT * REPLACE (CAST(date AS DATE) AS date, {numeric}) FROM {source}
+        """)
+        # Recalculate metrics in case they are missing or wrong
+        columns = {row[0] for row in self.con.execute("DESCRIBE ads_typed").fetchall()}
+        stale = [col for col in ('roas', 'ctr') if col in columns]
+        exclude = f" EXCLUDE ({', '.join(stale)})" if stale else ""
+        self.con.execute(f"""
+            CREATE OR REPLACE VIEW ads AS
+            SELECT *{exclude},
+                CASE WHEN spend > 0 THEN revenue / spend ELSE 0 END AS roas,
+                CASE WHEN impressions > 0 THEN clicks / impressions ELSE 0 END AS ctr
+            FROM ads_typed
+        """)
+
+    def _execute(self, query: str, params: Optional[list] = None):
+        # One cursor per query: cursors are safe to use from concurrent threads
+        return self.con.cursor().execute(query, params or [])
+
+    def row_count(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM ads").fetchone()[0]
+
+    def is_empty(self) -> bool:
+        return self.row_count() == 0
+
+    def max_date(self) -> pd.Timestamp:
+        return pd.Timestamp(self._execute("SELECT MAX(date) FROM ads").fetchone()[0])
+
+    def period_totals(self, dimensions: List[str], periods: Dict[str, Period]) -> pd.DataFrame:
+        cases = " ".join(
+            f"WHEN date BETWEEN DATE '{start.date()}' AND DATE '{end.date()}' THEN '{label}'"
+            for label, (start, end) in periods.items()
+        )
+        group_cols = [_quote(d) for d in dimensions] + ["period"]
+        sums = ", ".join(f"SUM({col}) AS {col}" for col in BASE_COLUMNS)
+        query = f"""
+            SELECT {", ".join(group_cols)}, {sums}
+            FROM (SELECT *, CASE {cases} END AS period FROM ads)
+            WHERE period IS NOT NULL
+            GROUP BY {", ".join(group_cols)}
+        """
+        return self._execute(query).df()
+
+    def daily_totals(self, dimensions: List[str]) -> pd.DataFrame:
+        group_cols = [_quote(d) for d in dimensions] + ["date"]
+        sums = ", ".join(f"SUM({col}) AS {col}" for col in BASE_COLUMNS)
+        query = f"SELECT {', '.join(group_cols)}, {sums} FROM ads GROUP BY {', '.join(group_cols)}"
+        totals = self._execute(query).df()
+        totals['date'] = pd.to_datetime(totals['date'])
+        return totals
+
+    def distinct(self, columns: List[str], filters: Optional[Dict[str, list]] = None) -> pd.DataFrame:
+        where, params = [], []
+        for column, values in (filters or {}).items():
+            if not values:
+                where.append("FALSE")
+                continue
+            where.append(f"{_quote(column)} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+        query = f"SELECT DISTINCT {', '.join(_quote(c) for c in columns)} FROM ads"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        return self._execute(query, params).df()
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def add_kpis(totals: pd.DataFrame) -> pd.DataFrame:
+    """Adds ROAS, CTR, CPC, CPA and CR columns derived from summed base columns (0 where undefined)."""
+    def ratio(num: str, den: str) -> pd.Series:
+        return (totals[num] / totals[den]).where(totals[den] > 0, 0.0)
+
+    return totals.assign(
+        roas=ratio('revenue', 'spend'),
+        ctr=ratio('clicks', 'impressions'),
+        cpc=ratio('spend', 'clicks'),
+        cpa=ratio('spend', 'purchases'),
+        cr=ratio('purchases', 'clicks'),  # Conversion Rate (Purchases / Clicks)
+    )
+
+
+def pivot_periods(totals: pd.DataFrame, dimensions: List[str], periods: List[str]) -> pd.DataFrame:
+    """
+    Turns long `period_totals` output into one row per segment with
+    `<kpi>_<period>` columns (missing periods filled with 0).
+    """
+    wide = add_kpis(totals).set_index(dimensions + ['period']).unstack('period', fill_value=0)
+    wide = wide.reindex(columns=pd.MultiIndex.from_product([wide.columns.levels[0], periods]), fill_value=0)
+    wide.columns = [f"{col}_{period}" for col, period in wide.columns]
+    return wide
+
+
+def period_windows(max_date: pd.Timestamp, window_days: int) -> Dict[str, Period]:
+    """The current window ending at `max_date` and the equally long window before it."""
+    current_start = max_date - pd.Timedelta(days=window_days - 1)
+    previous_end = current_start - pd.Timedelta(days=1)
+    previous_start = previous_end - pd.Timedelta(days=window_days - 1)
+    return {'current': (current_start, max_date), 'previous': (previous_start, previous_end)}
+
+
+_DUCKDB_BACKENDS: Dict[str, DuckDBBackend] = {}
+
+
+def get_backend(config: dict, df: Optional[pd.DataFrame] = None) -> AnalyticsBackend:
+    """
+    Returns the configured analytics backend.
+    The pandas backend wraps the loaded DataFrame; DuckDB backends are cached
+    per data file so the connection (and its view) is reused across nodes.
+    """
+    analytics_cfg = config.get("analytics", {})
+    if analytics_cfg.get("backend", "pandas") != "duckdb":
+        return PandasBackend(df)
+
+    data_path = (
+        config["paths"]["sample_data"]
+        if config["system"]["use_sample_data"]
+        else config["paths"]["full_data"]
+    )
+    if data_path not in _DUCKDB_BACKENDS:
+        duckdb_cfg = analytics_cfg.get("duckdb", {})
+        _DUCKDB_BACKENDS[data_path] = DuckDBBackend(
+            data_path,
+            threads=duckdb_cfg.get("threads"),
+            memory_limit=duckdb_cfg.get("memory_limit"),
+            temp_directory=duckdb_cfg.get("temp_directory"),
+        )
+    return _DUCKDB_BACKENDS[data_path]
@@ -0,0 +1,85 @@
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.analytics.contribution import RATIO_KPIS
+
+BASELINE_DIMENSIONS = ['campaign_name', 'adset_name', 'audience_type']
+
+
+def _design_matrix(dates: np.ndarray) -> np.ndarray:
+    """Intercept, linear trend (per week) and day-of-week dummies (Monday is the reference)."""
+    days = (dates - dates[0]).astype('timedelta64[D]').astype(float)
+    weekday = (dates.astype('datetime64[D]').astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+    dummies = (weekday[:, None] == np.arange(1, 7)).astype(float)
+    return np.column_stack([np.ones(len(dates)), days / 7.0, dummies])
+
+
+def fit_baselines(daily: pd.DataFrame, keys: List[str], current: Tuple[pd.Timestamp, pd.Timestamp],
+                  min_history_days: int = 14) -> pd.DataFrame:
+    """
+    Fits an expected-value model for every segment in one batched pass and
+    scores the `current` window against it.
+
+    `daily` holds one row per segment per day (keys + date + base columns).
+    For each ratio KPI (ROAS, CTR) the daily value is modelled as trend plus
+    day-of-week seasonality, fit by weighted least squares on the days before
+    the current window (weights = spend / impressions, so thin days count less).
+    All segments share the design matrix, so the normal equations for every
+    segment are formed with two matrix products and solved with one batched pinv.
+
+    For the current window, `<kpi>_expected` is the model's volume-weighted
+    prediction and `<kpi>_z` the actual-vs-expected residual in standard
+    errors, assuming daily variance inversely proportional to volume.
+    Segments with fewer than `min_history_days` active history days get NaN.
+    """
+    current_start, current_end = current
+    daily = daily[daily['date'] <= current_end]
+    codes = daily.groupby(keys, sort=False, dropna=False).ngroup().to_numpy()
+    names = daily[keys].drop_duplicates(keep='first').reset_index(drop=True)
+    dates, day_index = np.unique(daily['date'].to_numpy(dtype='datetime64[D]'), return_inverse=True)
+    n_segments, n_days = len(names), len(dates)
+
+    X = _design_matrix(dates)
+    n_params = X.shape[1]
+    # Per-day outer products x_t x_t', so every segment's X' W X is one matrix product
+    outer = np.einsum('tp,tq->tpq', X, X).reshape(n_days, n_params * n_params)
+    train = dates < np.datetime64(current_start.date())
+    in_window = ~train
+
+    # Dense (segment x day) grids; days a segment did not run stay at zero weight
+    cell = codes * n_days + day_index
+    n_cells = n_segments * n_days
+    active = np.bincount(cell, minlength=n_cells).reshape(n_segments, n_days) > 0
+    history_days = (active & train).sum(axis=1)
+
+    result = names.assign(history_days=history_days)
+    for kpi, (numerator, weight) in RATIO_KPIS.items():
+        num = np.bincount(cell, weights=daily[numerator].to_numpy(dtype=float), minlength=n_cells).reshape(n_segments, n_days)
+        den = np.bincount(cell, weights=daily[weight].to_numpy(dtype=float), minlength=n_cells).reshape(n_segments, n_days)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            y = np.where(den > 0, num / den, 0.0)
+
+        # Weighted normal equations for all segments at once: (X' W X) beta = X' W y
+        w = den * train
+        xtwx = (w @ outer).reshape(n_segments, n_params, n_params)
+        xtwy = (w * y) @ X
+        beta = np.einsum('spq,sq->sp', np.linalg.pinv(xtwx), xtwy)
+        fitted = beta @ X.T
+
+        fit_days = ((den > 0) & train).sum(axis=1)
+        residual_ss = (w * (y - fitted) ** 2).sum(axis=1)
+        window_volume = (den * in_window).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = residual_ss / np.maximum(fit_days - n_params, 1)  # variance of a unit-volume day
+            actual = (num * in_window).sum(axis=1) / window_volume
+            expected = (den * in_window * fitted).sum(axis=1) / window_volume
+            z = (actual - expected) / np.sqrt(scale / window_volume)
+        valid = (fit_days >= min_history_days) & (window_volume > 0) & (scale > 0)
+
+        result[f'{kpi}_actual'] = np.where(window_volume > 0, actual, np.nan)
+        result[f'{kpi}_expected'] = np.where(valid, expected, np.nan)
+        result[f'{kpi}_residual'] = np.where(valid, actual - expected, np.nan)
+        result[f'{kpi}_z'] = np.where(valid, z, np.nan)
+    return result
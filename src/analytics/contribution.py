@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+# KPI -> (numerator, weight) base columns; the overall KPI is the weight-share-weighted segment KPI
+RATIO_KPIS = {
+    'roas': ('revenue', 'spend'),
+    'ctr': ('clicks', 'impressions'),
+}
+
+
+def decompose_change(comparison: pd.DataFrame, kpi: str) -> pd.DataFrame:
+    """
+    Splits the change in an overall ratio KPI into per-segment mix and rate effects.
+
+    `comparison` is one row per segment with `<col>_previous` / `<col>_current`
+    base columns (as returned by `pivot_periods`). With w the segment's share of
+    the weight column (spend for ROAS, impressions for CTR) and r its KPI, the
+    overall KPI is sum(w * r) and its change splits symmetrically as
+
+        mix  = (w1 - w0) * ((r0 + r1) / 2 - R)     spend/impressions moving between segments
+        rate = (r1 - r0) * (w0 + w1) / 2            segments getting better or worse
+
+    where R is the average of the overall KPI over both periods (shares sum to 1
+    in both periods, so subtracting R leaves the totals unchanged but makes a
+    segment's mix effect negative when share moves into a below-average segment).
+    A segment with no weight in one period takes its rate from the other period,
+    so entering or leaving the mix is a pure mix effect. mix + rate summed over
+    all segments equals the overall change.
+
+    Returns one row per segment, largest absolute contribution first.
+    """
+    numerator, weight = RATIO_KPIS[kpi]
+    num0 = comparison[f"{numerator}_previous"].to_numpy(dtype=float)
+    num1 = comparison[f"{numerator}_current"].to_numpy(dtype=float)
+    den0 = comparison[f"{weight}_previous"].to_numpy(dtype=float)
+    den1 = comparison[f"{weight}_current"].to_numpy(dtype=float)
+
+    total0, total1 = den0.sum(), den1.sum()
+    w0 = den0 / total0 if total0 > 0 else np.zeros_like(den0)
+    w1 = den1 / total1 if total1 > 0 else np.zeros_like(den1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r0 = np.where(den0 > 0, num0 / den0, np.nan)
+        r1 = np.where(den1 > 0, num1 / den1, np.nan)
+    r0 = np.where(np.isnan(r0), r1, r0)
+    r1 = np.where(np.isnan(r1), r0, r1)
+    r0, r1 = np.nan_to_num(r0), np.nan_to_num(r1)
+
+    overall0 = num0.sum() / total0 if total0 > 0 else 0.0
+    overall1 = num1.sum() / total1 if total1 > 0 else 0.0
+    mix = (w1 - w0) * ((r0 + r1) / 2 - (overall0 + overall1) / 2)
+    rate = (r1 - r0) * (w0 + w1) / 2
+
+    result = pd.DataFrame({
+        'share_previous': w0, 'share_current': w1,
+        f'{kpi}_previous': r0, f'{kpi}_current': r1,
+        'mix_effect': mix, 'rate_effect': rate, 'total_effect': mix + rate,
+    }, index=comparison.index)
+    order = np.argsort(-np.abs(result['total_effect'].to_numpy()), kind='stable')
+    return result.iloc[order]
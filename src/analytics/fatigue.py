@@ -0,0 +1,145 @@
+import math
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+CREATIVE_KEYS = ['creative_type', 'creative_message']
+
+
+def _grouped_slopes(codes: np.ndarray, x: np.ndarray, y: np.ndarray, w: np.ndarray,
+                    mask: np.ndarray, n_groups: int):
+    """
+    Weighted least-squares slope of y on x for every group at once, using only rows in `mask`.
+    Returns (slopes, weighted residual sums of squares, weighted centered sums of
+    squares of x, counts); Var(slope) = residual variance of a unit-weight point / cxx.
+    Groups with too few points get NaN slopes.
+    """
+    codes, x, y, w = codes[mask], x[mask], y[mask], w[mask]
+    n = np.bincount(codes, minlength=n_groups).astype(float)
+    sw = np.bincount(codes, weights=w, minlength=n_groups)
+    sx = np.bincount(codes, weights=w * x, minlength=n_groups)
+    sy = np.bincount(codes, weights=w * y, minlength=n_groups)
+    sxx = np.bincount(codes, weights=w * x * x, minlength=n_groups)
+    sxy = np.bincount(codes, weights=w * x * y, minlength=n_groups)
+    syy = np.bincount(codes, weights=w * y * y, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Weighted centered sums of squares
+        cxx = sxx - sx * sx / sw
+        cxy = sxy - sx * sy / sw
+        cyy = syy - sy * sy / sw
+        slopes = np.where(cxx > 0, cxy / cxx, np.nan)
+        residual_ss = np.maximum(cyy - slopes * cxy, 0)
+    return slopes, residual_ss, cxx, n
+
+
+def _t_tail(t: np.ndarray, df: np.ndarray) -> np.ndarray:
+    """
+    P(T > t) for Student's t with integer `df` >= 1, elementwise
+    (the finite series of Abramowitz & Stegun 26.7.3 / 26.7.4).
+    """
+    t, df = np.asarray(t, dtype=float), np.asarray(df, dtype=np.int64)
+    theta = np.arctan(t / np.sqrt(df))
+    cos, sin = np.cos(theta), np.sin(theta)
+    odd = df % 2 == 1
+    # Odd df: cos + 2/3 cos^3 + (2*4)/(3*5) cos^5 ... up to cos^(df-2);
+    # even df: 1 + 1/2 cos^2 + (1*3)/(2*4) cos^4 ... up to cos^(df-2)
+    term = np.where(odd, cos, 1.0)
+    series = np.where(odd & (df < 3), 0.0, term)
+    for j in range(1, (int(df.max(initial=1)) - 1) // 2 + 1):
+        term = term * cos * cos * np.where(odd, 2 * j / (2 * j + 1), (2 * j - 1) / (2 * j))
+        power = np.where(odd, 2 * j + 1, 2 * j)
+        series = series + np.where(power <= df - 2, term, 0.0)
+    central = np.where(odd, 2 / np.pi * (theta + sin * series), sin * series)  # P(-t < T < t)
+    return (1 - central) / 2
+
+
+def fit_fatigue_curves(daily: pd.DataFrame, keys: List[str] = CREATIVE_KEYS,
+                       recent_days: int = 7, min_days: int = 6, min_window_days: int = 5,
+                       acceleration_margin: float = 0.01, z_threshold: float = 3.0) -> pd.DataFrame:
+    """
+    Fits a CTR decay curve for every creative in one vectorized pass.
+
+    `daily` holds one row per creative per day (keys + date + clicks/impressions).
+    Each creative's daily CTR is indexed by age (days since its first impression)
+    and log(CTR) is regressed on age by least squares weighted by each day's
+    impressions (so one low-volume day, such as a zero-click day, cannot dominate
+    the slope), overall and separately for its last
+    `recent_days` days vs. the days before. A creative is flagged as
+    accelerating when its recent decay is steeper than its earlier decay
+    by more than `acceleration_margin` (in log-CTR per day) and significantly:
+    the slope difference is tested against a Student-t tail with Welch degrees
+    of freedom (a recent window has only a few points, so a normal threshold
+    would flag far too many), at the one-sided level of a normal `z_threshold`.
+    Both windows need `min_window_days` active days; with fewer, the Welch
+    approximation is too loose to hold that level.
+
+    Returns one row per creative with decay rates as the fractional CTR
+    lost per day (positive = decaying), flagged creatives first, then by recent decay.
+    """
+    daily = daily[daily['impressions'] > 0]
+    if daily.empty:
+        return pd.DataFrame(columns=keys + [
+            'days_active', 'impressions', 'ctr', 'decay_rate', 'early_decay_rate',
+            'recent_decay_rate', 'accelerating'
+        ])
+
+    codes = daily.groupby(keys, sort=False, dropna=False).ngroup().to_numpy()
+    n_groups = int(codes.max()) + 1
+
+    dates = daily['date'].to_numpy(dtype='datetime64[D]')
+    first_seen = np.full(n_groups, np.datetime64('9999-12-31'), dtype='datetime64[D]')
+    np.minimum.at(first_seen, codes, dates)
+    age = (dates - first_seen[codes]).astype(float)
+    max_age = np.zeros(n_groups)
+    np.maximum.at(max_age, codes, age)
+
+    clicks = daily['clicks'].to_numpy(dtype=float)
+    impressions = daily['impressions'].to_numpy(dtype=float)
+    # Smoothed so zero-click days stay finite on the log scale
+    log_ctr = np.log((clicks + 0.5) / (impressions + 1.0))
+    # The variance of log(CTR) shrinks with volume, so days count by their impressions
+    weights = impressions
+
+    everything = np.ones(len(age), dtype=bool)
+    recent = age > max_age[codes] - recent_days
+    slope, _, _, days_active = _grouped_slopes(codes, age, log_ctr, weights, everything, n_groups)
+    early_slope, early_ss, early_cxx, n_early = _grouped_slopes(codes, age, log_ctr, weights, ~recent, n_groups)
+    recent_slope, recent_ss, recent_cxx, n_recent = _grouped_slopes(codes, age, log_ctr, weights, recent, n_groups)
+    steepening = early_slope - recent_slope
+
+    # Welch test on the slope difference: each fit keeps its own residual variance
+    # (so an outlier day in the recent window widens its error rather than being
+    # averaged away), with Welch-Satterthwaite degrees of freedom, floored
+    early_df, recent_df = n_early - 2, n_recent - 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        early_var = early_ss / early_df / early_cxx
+        recent_var = recent_ss / recent_df / recent_cxx
+        t_stat = steepening / np.sqrt(early_var + recent_var)
+        welch_df = (early_var + recent_var) ** 2 / (early_var ** 2 / early_df + recent_var ** 2 / recent_df)
+    enough_points = (days_active >= min_days) & (n_early >= min_window_days) & (n_recent >= min_window_days)
+    welch_df = np.floor(np.clip(np.nan_to_num(welch_df, nan=1.0), 1, np.maximum(early_df + recent_df, 1)))
+    p_value = np.where(enough_points, _t_tail(np.nan_to_num(t_stat), welch_df), 1.0)
+
+    total_clicks = np.bincount(codes, weights=clicks, minlength=n_groups)
+    total_impressions = np.bincount(codes, weights=impressions, minlength=n_groups)
+
+    accelerating = (
+        enough_points & (recent_slope < 0) & (steepening > acceleration_margin)
+        & (p_value < 0.5 * math.erfc(z_threshold / math.sqrt(2)))
+    )
+
+    # ngroup(sort=False) numbers creatives in order of first appearance
+    names = daily[keys].drop_duplicates(keep='first').reset_index(drop=True)
+    curves = names.assign(
+        days_active=days_active.astype(int),
+        impressions=total_impressions,
+        ctr=total_clicks / total_impressions,
+        decay_rate=-np.expm1(slope),
+        early_decay_rate=-np.expm1(early_slope),
+        recent_decay_rate=-np.expm1(recent_slope),
+        accelerating=accelerating,
+    )
+    return curves.sort_values(
+        ['accelerating', 'recent_decay_rate'], ascending=False, na_position='last'
+    ).reset_index(drop=True)
@@ -0,0 +1,186 @@
+import hashlib
+import os
+import re
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+_SHIFT = np.uint64(32)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercases and collapses punctuation/whitespace so trivial edits don't count as new copy."""
+    return re.sub(r"[^a-z0-9]+", " ", str(text).lower()).strip()
+
+
+class MinHashLSH:
+    """
+    MinHash signatures over character shingles plus an LSH band index.
+
+    Each text is reduced to `num_perm` MinHash values (whose agreement rate
+    estimates Jaccard similarity of the shingle sets). Signatures are cut into
+    `bands` bands; texts sharing any band are candidates. Band keys are kept
+    sorted per band, so a query is `bands` binary searches (O(bands * log n))
+    plus an exact signature comparison against the few candidates.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 32, shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands}).")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        # Multiply-shift permutations: ((a * x + b) mod 2**64) >> 32, with a odd
+        self._a = rng.integers(0, 1 << 64, num_perm, dtype=np.uint64, endpoint=False) | np.uint64(1)
+        self._b = rng.integers(0, 1 << 64, num_perm, dtype=np.uint64, endpoint=False)
+        # Random odd multipliers that fold a band's rows into a single uint64 key
+        self._band_mix = rng.integers(1, 1 << 63, num_perm, dtype=np.uint64) | np.uint64(1)
+
+        self.texts = np.array([], dtype=str)
+        self.signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._band_keys = np.empty((bands, 0), dtype=np.uint64)
+        self._band_docs = np.empty((bands, 0), dtype=np.int64)
+
+    # --- Building ---
+
+    def _shingles(self, text: str) -> List[int]:
+        text = normalize_text(text)
+        k = self.shingle_size
+        grams = {text[i:i + k] for i in range(max(len(text) - k + 1, 1))}
+        return [zlib.crc32(g.encode()) for g in grams]
+
+    def signatures_for(self, texts: Iterable[str], chunk_rows: int = 50_000) -> np.ndarray:
+        """MinHash signatures (n_texts x num_perm), computed in vectorized chunks of shingles."""
+        shingles = [self._shingles(t) for t in texts]
+        counts = np.array([len(s) for s in shingles], dtype=np.int64)
+        hashes = np.fromiter((h for s in shingles for h in s), dtype=np.uint64, count=int(counts.sum()))
+        ends = np.cumsum(counts)
+        starts = ends - counts
+
+        signatures = np.empty((len(counts), self.num_perm), dtype=np.uint32)
+        doc = 0
+        while doc < len(counts):
+            # Take as many whole texts as fit in one chunk of shingle rows
+            end = max(int(np.searchsorted(ends, starts[doc] + chunk_rows, side='right')), doc + 1)
+            lo, hi = starts[doc], ends[end - 1]
+            # (num_perm x shingles) layout keeps the per-text min reduction contiguous
+            permuted = np.multiply.outer(self._a, hashes[lo:hi])
+            permuted += self._b[:, None]
+            permuted >>= _SHIFT
+            signatures[doc:end] = np.minimum.reduceat(permuted.astype(np.uint32), starts[doc:end] - lo, axis=1).T
+            doc = end
+        return signatures
+
+    def _band_hashes(self, signatures: np.ndarray) -> np.ndarray:
+        """One uint64 key per (band, text); multiplication wraps mod 2**64 by design."""
+        rows = self.num_perm // self.bands
+        mixed = signatures.astype(np.uint64) * self._band_mix
+        return mixed.reshape(len(signatures), self.bands, rows).sum(axis=2, dtype=np.uint64).T
+
+    def build(self, texts: List[str]) -> "MinHashLSH":
+        """Indexes `texts` (replacing any previous contents)."""
+        self.texts = np.array(texts, dtype=str)
+        self.signatures = self.signatures_for(texts)
+        keys = self._band_hashes(self.signatures)
+        order = np.argsort(keys, axis=1, kind='stable')
+        self._band_keys = np.take_along_axis(keys, order, axis=1)
+        self._band_docs = order
+        return self
+
+    # --- Querying ---
+
+    def query(self, text: str, signature: Optional[np.ndarray] = None) -> Tuple[float, Optional[str]]:
+        """Returns (estimated Jaccard similarity, text) of the closest indexed text, or (0.0, None)."""
+        if len(self.texts) == 0:
+            return 0.0, None
+        signature = self.signatures_for([text])[0] if signature is None else signature
+        keys = self._band_hashes(signature[None, :])[:, 0]
+        candidates = []
+        for band in range(self.bands):
+            lo = np.searchsorted(self._band_keys[band], keys[band], side='left')
+            hi = np.searchsorted(self._band_keys[band], keys[band], side='right')
+            candidates.append(self._band_docs[band, lo:hi])
+        candidates = np.unique(np.concatenate(candidates))
+        if len(candidates) == 0:
+            return 0.0, None
+        similarity = (self.signatures[candidates] == signature).mean(axis=1)
+        best = int(np.argmax(similarity))
+        return float(similarity[best]), str(self.texts[candidates[best]])
+
+    def filter(self, candidates: List[str], threshold: float) -> Tuple[List[bool], List[dict]]:
+        """
+        Returns (keep flag per candidate, rejected). A candidate is rejected when it is
+        at least `threshold` similar to an indexed text or to a candidate kept before it.
+        """
+        signatures = self.signatures_for(candidates)
+        keep, kept_signatures, kept_texts, rejected = [], [], [], []
+        for text, signature in zip(candidates, signatures):
+            similarity, match = self.query(text, signature)
+            if kept_signatures:
+                batch = (np.array(kept_signatures) == signature).mean(axis=1)
+                if batch.max() > similarity:
+                    similarity, match = float(batch.max()), kept_texts[int(np.argmax(batch))]
+            keep.append(similarity < threshold)
+            if keep[-1]:
+                kept_signatures.append(signature)
+                kept_texts.append(text)
+            else:
+                rejected.append({'text': text, 'similar_to': match, 'similarity': round(similarity, 3)})
+        return keep, rejected
+
+    # --- Persistence ---
+
+    def fingerprint(self, texts: List[str]) -> str:
+        """Identifies an index built over `texts` with these parameters."""
+        digest = hashlib.blake2b(digest_size=12)
+        digest.update(f"{self.num_perm}:{self.bands}:{self.shingle_size}:{self.seed}".encode())
+        for text in sorted(texts):
+            digest.update(text.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, texts=self.texts, signatures=self.signatures,
+                 band_keys=self._band_keys, band_docs=self._band_docs)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> "MinHashLSH":
+        with np.load(path) as data:
+            self.texts = data['texts']
+            self.signatures = data['signatures']
+            self._band_keys = data['band_keys']
+            self._band_docs = data['band_docs']
+        return self
+
+
+_INDEXES: Dict[str, MinHashLSH] = {}
+_LOCK = threading.Lock()
+
+
+def load_or_build_index(texts: List[str], cache_dir: str, num_perm: int = 128, bands: int = 32,
+                        shingle_size: int = 5) -> MinHashLSH:
+    """
+    Returns the index for this corpus: from memory, else from its persisted
+    file, else built (and saved) on first use.
+    """
+    index = MinHashLSH(num_perm=num_perm, bands=bands, shingle_size=shingle_size)
+    path = os.path.join(cache_dir, f"creative_lsh-{index.fingerprint(texts)}.npz")
+    with _LOCK:
+        if path in _INDEXES:
+            return _INDEXES[path]
+        if os.path.exists(path):
+            try:
+                _INDEXES[path] = index.load(path)
+                return index
+            except Exception as e:
+                print(f"Warning: Could not read near-duplicate index {path} ({e}); rebuilding.")
+        print(f"Building near-duplicate index over {len(texts):,} creative messages -> {path}")
+        _INDEXES[path] = index.build(texts)
+        index.save(path)
+        return index
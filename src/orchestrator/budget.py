@@ -0,0 +1,102 @@
+import threading
+import time
+from typing import Any, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import LLMResult
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Sums `usage_metadata.total_tokens` over every LLM call made during a run."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self.total_tokens = 0
+        self.calls = 0
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if isinstance(message, AIMessage) and message.usage_metadata:
+                    tokens += message.usage_metadata.get("total_tokens", 0)
+        with self._lock:
+            self.total_tokens += tokens
+            self.calls += 1
+
+
+class RunBudget:
+    """
+    Per-run latency and token budget.
+    Limits of None mean unlimited. Affordability is judged against
+    per-call estimates, since the cost of an LLM call is only known after it returns.
+    """
+
+    def __init__(self, max_latency_s: Optional[float] = None, max_tokens: Optional[int] = None,
+                 est_call_latency_s: float = 4.0, est_call_tokens: int = 2500,
+                 est_campaign_tokens: int = 400, degraded_max_hypotheses: int = 3, degraded_creative_top_n: int = 1):
+        self.max_latency_s = max_latency_s
+        self.max_tokens = max_tokens
+        self.est_call_latency_s = est_call_latency_s
+        self.est_call_tokens = est_call_tokens
+        self.est_campaign_tokens = est_campaign_tokens
+        self.degraded_max_hypotheses = degraded_max_hypotheses
+        self.degraded_creative_top_n = degraded_creative_top_n
+        self.callback = TokenUsageCallback()
+        self.started = time.monotonic()
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RunBudget":
+        budget_cfg = config.get("budget", {})
+        return cls(
+            max_latency_s=budget_cfg.get("max_latency_s"),
+            max_tokens=budget_cfg.get("max_tokens"),
+            est_call_latency_s=budget_cfg.get("est_call_latency_s", 4.0),
+            est_call_tokens=budget_cfg.get("est_call_tokens", 2500),
+            est_campaign_tokens=budget_cfg.get("est_campaign_tokens", 400),
+            degraded_max_hypotheses=budget_cfg.get("degraded_max_hypotheses", 3),
+            degraded_creative_top_n=budget_cfg.get("degraded_creative_top_n", 1),
+        )
+
+    @property
+    def elapsed_s(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def tokens_used(self) -> int:
+        return self.callback.total_tokens
+
+    def remaining_latency_s(self) -> float:
+        if self.max_latency_s is None:
+            return float("inf")
+        return self.max_latency_s - self.elapsed_s
+
+    def remaining_tokens(self) -> float:
+        if self.max_tokens is None:
+            return float("inf")
+        return self.max_tokens - self.tokens_used
+
+    def can_afford(self, llm_calls: int, extra_tokens: int = 0) -> bool:
+        """
+        True if `llm_calls` more sequential LLM calls (plus `extra_tokens` of
+        prompt/output that scale with the call's inputs) fit in both budgets.
+        """
+        return (
+            self.remaining_latency_s() >= llm_calls * self.est_call_latency_s
+            and self.remaining_tokens() >= llm_calls * self.est_call_tokens + extra_tokens
+        )
+
+    def exhausted(self) -> bool:
+        return self.remaining_latency_s() <= 0 or self.remaining_tokens() <= 0
+
+    def snapshot(self) -> dict:
+        """Compact view for the run log."""
+        return {
+            "elapsed_s": round(self.elapsed_s, 3),
+            "tokens_used": self.tokens_used,
+            "max_latency_s": self.max_latency_s,
+            "max_tokens": self.max_tokens,
+        }
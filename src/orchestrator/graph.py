@@ -1,36 +1,76 @@
+import functools
 import json
+import os
+import time
 import yaml
 from langgraph.graph import StateGraph, END
-from typing import Literal
+from langgraph.types import Send
+from typing import List, Literal, Callable, Union
 
 from src.orchestrator.graph_state import AgentState
 from src.agents.planner_agent import get_planner_agent
-from src.agents.data_agent import DataAgent
-from src.agents.insight_agent import get_insight_agent
+from src.agents.data_agent import DataAgent, INSIGHT_GROUPS
+from src.agents.insight_agent import get_insight_agent, get_insight_branch, get_insight_merger
 from src.agents.evaluator_agent import EvaluatorAgent
-from src.agents.creative_agent import get_creative_agent
+from src.agents.creative_agent import get_creative_agent, get_creative_generator
+from src.orchestrator.speculation import CreativeSpeculation
+from src.utils.run_log import get_run_logger
+from src.utils.prompts import preload_prompts
 
-def build_agent_graph(config: dict):
+# Sequential LLM calls still ahead on the default path, counting the node itself.
+# The insight branches run concurrently, so they count as one call of latency,
+# but each spends its own tokens (see _insight_fan_out)
+_LLM_CALLS_AHEAD = {"planner": 3, "generate_insights": 2, "generate_creatives": 1}
+
+# Served when the planner is skipped and no cached plan exists for the query
+DEFAULT_PLAN = [
+    "Load the full dataset.",
+    "Summarize period-over-period performance by campaign and audience.",
+    "Generate hypotheses explaining the performance change.",
+    "Quantitatively validate each hypothesis.",
+    "Propose new creatives for low-CTR campaigns.",
+]
+
+def build_agent_graph(config: dict, profiler=None):
     """
     Builds the main agentic graph.
+    If a NodeProfiler is given, every node is profiled (see --profile).
     """
+    # Compile every prompt once; agents share these templates and the pooled LLM clients
+    preload_prompts(config)
+
     # Initialize agents
     planner_agent = get_planner_agent(config)
     data_agent = DataAgent(config)
     insight_agent = get_insight_agent(config)
+    insight_branch = get_insight_branch(config)
+    merge_insights = get_insight_merger(config)
     evaluator_agent = EvaluatorAgent(config)
-    creative_agent = get_creative_agent(config)
+    generate_creatives = get_creative_generator(config)
+    creative_agent = get_creative_agent(config, generate_creatives)
+    run_logger = get_run_logger(config)
 
     # Define the graph
     workflow = StateGraph(AgentState)
 
-    # Add nodes
-    workflow.add_node("planner", planner_agent)
-    workflow.add_node("load_data", data_agent.load_data_node)
-    workflow.add_node("summarize_data", data_agent.summarize_data_node)
-    workflow.add_node("generate_insights", insight_agent)
-    workflow.add_node("evaluate_insights", evaluator_agent.evaluate_node)
-    workflow.add_node("generate_creatives", creative_agent)
+    # Add nodes (each wrapped to emit start/end events to the run log)
+    nodes = {
+        "planner": planner_agent,
+        "load_data": data_agent.load_data_node,
+        "summarize_data": data_agent.summarize_data_node,
+        "generate_insights": insight_agent,
+        "insight_branch": insight_branch,
+        "merge_insights": merge_insights,
+        "evaluate_insights": evaluator_agent.evaluate_node,
+        "generate_creatives": creative_agent,
+    }
+    for name, node in nodes.items():
+        node = _enforce_budget(name, node, config, run_logger)
+        if config.get("orchestration", {}).get("speculative_creatives", False):
+            node = _speculate(name, node, config, run_logger, generate_creatives)
+        if profiler is not None:
+            node = profiler.wrap(name, node)
+        workflow.add_node(name, _instrument(name, node, run_logger))
 
     # Set entry point
     workflow.set_entry_point("planner")
@@ -39,9 +79,13 @@ def build_agent_graph(config: dict):
     workflow.add_edge("planner", "load_data")
     workflow.add_edge("load_data", "summarize_data")
     workflow.add_edge("summarize_data", "generate_insights")
+
+    # Map-reduce insights: one concurrent branch per segment group, then merge
+    workflow.add_conditional_edges("generate_insights", fan_out_insights, ["insight_branch", "merge_insights"])
+    workflow.add_edge("insight_branch", "merge_insights")
     
     # This is the evaluation loop 
-    workflow.add_edge("generate_insights", "evaluate_insights")
+    workflow.add_edge("merge_insights", "evaluate_insights")
     
     workflow.add_conditional_edges(
         "evaluate_insights",
@@ -65,6 +109,247 @@ def build_agent_graph(config: dict):
 
     return app
 
+def _instrument(name: str, node: Callable, run_logger) -> Callable:
+    """Wraps a node so that each execution is recorded as compact run-log events."""
+    def wrapped(state: AgentState) -> AgentState:
+        run_id = state.get("run_id")
+        run_logger.log_event(run_id, name, "start")
+        started = time.perf_counter()
+        try:
+            result = node(state)
+        except Exception as e:
+            run_logger.log_event(
+                run_id, name, "error",
+                duration_ms=round((time.perf_counter() - started) * 1000, 1),
+                error=repr(e),
+            )
+            raise
+        run_logger.log_event(
+            run_id, name, "end",
+            duration_ms=round((time.perf_counter() - started) * 1000, 1),
+            **_state_counts(result),
+        )
+        return result
+
+    return wrapped
+
+def _enforce_budget(name: str, node: Callable, config: dict, run_logger) -> Callable:
+    """
+    Wraps a node with the run's latency/token budget policy.
+    When the remaining budget cannot cover the LLM calls still ahead, the node
+    degrades predictably instead of running in full:
+      - planner: serve the cached plan for this query (or DEFAULT_PLAN)
+      - generate_insights: fans out only as many branches as the remaining tokens
+        cover (one call each), or none once the budget is exhausted
+      - evaluate_insights: only the top-N hypotheses by initial confidence
+      - generate_creatives: skipped, or shrunk to fewer campaigns when the
+        per-campaign token estimate for the full list does not fit, and without
+        the near-duplicate retry when a second call does not fit
+    """
+    def wrapped(state: AgentState) -> AgentState:
+        budget = state.get("budget")
+        if budget is None:
+            state = node(state)
+            if name == "planner":
+                _store_cached_plan(config, state["user_query"], state["plan"])
+            return state
+
+        if name == "planner":
+            # The insight fan-out spends one call's tokens per branch beyond the first
+            fan_out_tokens = (_insight_fan_out(config) - 1) * budget.est_call_tokens
+            if not budget.can_afford(_LLM_CALLS_AHEAD[name], fan_out_tokens):
+                cached = _load_cached_plan(config, state["user_query"])
+                state["plan"] = cached or list(DEFAULT_PLAN)
+                decision = "serve_cached_plan" if cached else "serve_default_plan"
+                n_calls = _LLM_CALLS_AHEAD[name] + _insight_fan_out(config) - 1
+                _record_degradation(state, run_logger, name, decision, budget, n_calls)
+                return state
+            state = node(state)
+            _store_cached_plan(config, state["user_query"], state["plan"])
+            return state
+
+        if name == "generate_insights":
+            # The branches run concurrently (one call of latency), but each spends one call's tokens
+            if budget.exhausted():
+                tasks, affordable = [], 0
+            else:
+                state = node(state)
+                tasks = state["insight_tasks"]
+                affordable = len(tasks)
+                if budget.max_tokens is not None:
+                    affordable = min(affordable, int(max(budget.remaining_tokens(), 0) // budget.est_call_tokens))
+            if affordable == 0:
+                n_calls = len(tasks) or _insight_fan_out(config)
+                state["insight_tasks"] = []
+                state["hypotheses"] = []
+                _record_degradation(state, run_logger, name, "skip_insights", budget, n_calls)
+            elif affordable < len(tasks):
+                # Groups are kept in their configured order
+                state["insight_tasks"] = tasks[:affordable]
+                _record_degradation(state, run_logger, name, f"cap_insight_groups_{affordable}", budget, len(tasks))
+            return state
+
+        if name == "evaluate_insights" and not budget.can_afford(_LLM_CALLS_AHEAD["generate_creatives"]):
+            cap = budget.degraded_max_hypotheses
+            if len(state["hypotheses"]) > cap:
+                state["hypotheses"] = sorted(
+                    state["hypotheses"], key=lambda h: h.get("confidence", 0), reverse=True
+                )[:cap]
+                _record_degradation(state, run_logger, name, f"cap_hypotheses_{cap}", budget, 1)
+
+        if name == "generate_creatives":
+            # Fewer campaigns is still one call, but a smaller prompt and output:
+            # shrink when only the tokens for the full campaign list are missing
+            top_n = budget.degraded_creative_top_n
+            if not _can_afford_creatives(budget, state["low_ctr_campaigns"]):
+                _record_degradation(state, run_logger, name, "skip_creatives", budget, 1)
+                return state
+            if not budget.can_afford(1, len(state["low_ctr_campaigns"]) * budget.est_campaign_tokens):
+                state["low_ctr_campaigns"] = state["low_ctr_campaigns"][:top_n]
+                _record_degradation(state, run_logger, name, f"shrink_creatives_{top_n}", budget, 1)
+            # The near-duplicate retry is a second call, for (at most) the same campaigns
+            campaign_tokens = len(state["low_ctr_campaigns"]) * budget.est_campaign_tokens
+            if _creative_retry_enabled(config) and not budget.can_afford(2, 2 * campaign_tokens):
+                state["creative_retry"] = False
+                _record_degradation(state, run_logger, name, "no_creative_retry", budget, 2)
+
+        return node(state)
+
+    return wrapped
+
+def _speculate(name: str, node: Callable, config: dict, run_logger, generate: Callable) -> Callable:
+    """
+    Opt-in speculative creative generation.
+    After summarize_data, creative generation is launched in the background so
+    it overlaps the insight and evaluation LLM round-trips. It starts before
+    any insight exists, so it is grounded in the data summary only.
+    generate_creatives then uses that result instead of making its own call,
+    or, when `speculative_refine` is set and the budget covers the call,
+    regenerates with the validated insights (falling back to the speculative
+    result if that produces nothing). should_continue discards it if the run ends.
+    """
+    refine = config.get("orchestration", {}).get("speculative_refine", False)
+
+    def wrapped(state: AgentState) -> AgentState:
+        budget = state.get("budget")
+
+        if name == "summarize_data":
+            state = node(state)
+            # The speculative call (and its near-duplicate retry) spends tokens on top of the insight calls
+            creative_calls = 2 if _creative_retry_enabled(config) else 1
+            fan_out_tokens = 0 if budget is None else (_insight_fan_out(config) - 1) * budget.est_call_tokens
+            if state["low_ctr_campaigns"] and (budget is None or budget.can_afford(1 + creative_calls, fan_out_tokens)):
+                print("Orchestrator: Launching speculative creative generation.")
+                state["speculation"] = CreativeSpeculation(
+                    functools.partial(generate, fatigued_creatives=state.get("fatigued_creatives", [])),
+                    state["data_summary"], state["low_ctr_campaigns"],
+                    state["full_data"], run_logger, state.get("run_id")
+                )
+            return state
+
+        speculation = state.get("speculation")
+        if name != "generate_creatives" or speculation is None:
+            return node(state)
+
+        timeout = None
+        if budget is not None and budget.max_latency_s is not None:
+            timeout = max(budget.remaining_latency_s(), 0.0)
+        recommendations = speculation.collect(state["low_ctr_campaigns"], timeout=timeout)
+        if recommendations is None:
+            return node(state)
+
+        # Same check as _enforce_budget, so the refine is never skipped by the node itself
+        if refine and (budget is None or _can_afford_creatives(budget, state["low_ctr_campaigns"])):
+            refine_start = time.perf_counter()
+            state = node(state)
+            if state["creative_recommendations"]:
+                speculation.mark_refined(time.perf_counter() - refine_start)
+                return state
+            print("Orchestrator: Refine produced no creatives; falling back to the speculative result.")
+
+
+        print("---  EXECUTING CREATIVE AGENT (SPECULATIVE RESULT) ---")
+        state["log"].append("Creative Agent: Using speculative recommendations.")
+        state["creative_recommendations"] = recommendations
+        speculation.mark_used()
+        return state
+
+    return wrapped
+
+def _insight_fan_out(config: dict) -> int:
+    """Insight calls the fan-out makes before the tasks exist: one per configured segment group."""
+    groups = config.get("analysis", {}).get("insights", {}).get("groups", INSIGHT_GROUPS)
+    return max(len(groups), 1)
+
+def _can_afford_creatives(budget, campaigns: List[str]) -> bool:
+    """True if the budget covers a creative call, shrunk to degraded_creative_top_n campaigns if need be."""
+    n_campaigns = min(len(campaigns), budget.degraded_creative_top_n)
+    return budget.can_afford(1, n_campaigns * budget.est_campaign_tokens)
+
+def _creative_retry_enabled(config: dict) -> bool:
+    """True if creative generation may make a second call for campaigns emptied by the near-duplicate filter."""
+    dedup_cfg = config.get("analysis", {}).get("creative_dedup", {})
+    return dedup_cfg.get("enabled", True) and dedup_cfg.get("regenerate", True)
+
+def _record_degradation(state: AgentState, run_logger, node: str, decision: str, budget, llm_calls: int):
+    """Records a budget-driven degradation in the state, stdout and the run log."""
+    remaining = []
+    if budget.max_latency_s is not None:
+        remaining.append(f"{budget.remaining_latency_s():.1f}s")
+    if budget.max_tokens is not None:
+        remaining.append(f"{budget.remaining_tokens():.0f} tokens")
+    reason = f"remaining {' / '.join(remaining)} cannot cover {llm_calls} LLM call(s)"
+    print(f"Orchestrator: Degrading '{node}' -> {decision} ({reason}).")
+    state["log"].append(f"Orchestrator: Degraded '{node}' -> {decision} ({reason}).")
+    state["degradations"].append({"node": node, "decision": decision, "reason": reason})
+    run_logger.log_event(
+        state.get("run_id"), node, "degrade",
+        decision=decision, reason=reason, **budget.snapshot()
+    )
+
+def _planner_cache_path(config: dict) -> str:
+    return os.path.join(config["paths"].get("cache", "cache/"), "planner_cache.json")
+
+def _load_cached_plan(config: dict, query: str) -> list:
+    try:
+        with open(_planner_cache_path(config), "r") as f:
+            return json.load(f).get(query.strip().lower(), [])
+    except (FileNotFoundError, ValueError):
+        return []
+
+def _store_cached_plan(config: dict, query: str, plan: list):
+    if not plan:
+        return
+    path = _planner_cache_path(config)
+    try:
+        with open(path, "r") as f:
+            cache = json.load(f)
+    except (FileNotFoundError, ValueError):
+        cache = {}
+    cache[query.strip().lower()] = plan
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(cache, f)
+
+def _state_counts(state: dict) -> dict:
+    """Small, size-bounded snapshot of a state (counts instead of payloads)."""
+    counts = {}
+    for key in ("plan", "hypotheses", "validated_insights", "low_ctr_campaigns", "creative_recommendations"):
+        if isinstance(state.get(key), list):
+            counts[f"n_{key}"] = len(state[key])
+    df = state.get("full_data")
+    if df is not None and hasattr(df, "shape"):
+        counts["n_rows"] = int(df.shape[0])
+    return counts
+
+def fan_out_insights(state: AgentState) -> Union[List[Send], str]:
+    """Sends each insight task to its own branch (straight to the merge if there are none)."""
+    tasks = state.get("insight_tasks") or []
+    if not tasks:
+        return "merge_insights"
+    shared = {"user_query": state["user_query"], "run_id": state.get("run_id"), "budget": state.get("budget")}
+    return [Send("insight_branch", {**task, **shared}) for task in tasks]
+
 def should_continue(state: AgentState) -> Literal["generate_creatives", "log_and_finish"]:
     """
     Decision node: Checks if insights were validated.
@@ -77,6 +362,8 @@ def should_continue(state: AgentState) -> Literal["generate_creatives", "log_and
         return "generate_creatives"
     else:
         print("Decision: No validated insights. Finishing run.")
+        if state.get("speculation") is not None:
+            state["speculation"].discard("no validated insights")
         return "log_and_finish"
 
 def save_outputs(state: dict, config: dict):
@@ -122,10 +409,14 @@ def save_outputs(state: dict, config: dict):
                     f.write(f"-   {m}\n")
                 f.write("\n")
                 
-    # Save logs
-    with open(f"{config['paths']['logs']}run_log.json", "w") as f:
-        # Need to handle non-serializable items like DataFrames
-        log_state = {k: v for k, v in state.items() if k not in ['full_data']}
-        json.dump(log_state, f, indent=2, default=str)
+    # Append the run summary to the event log (full payloads live in reports/)
+    get_run_logger(config).log_event(
+        state.get("run_id"), "save_outputs", "run_complete",
+        query=state["user_query"],
+        validated=[i["hypothesis"] for i in state["validated_insights"]],
+        degradations=state.get("degradations", []),
+        budget=state["budget"].snapshot() if state.get("budget") else None,
+        **_state_counts(state),
+    )
         
     print(f"Outputs saved to {report_path}")
\ No newline at end of file
@@ -1,10 +1,23 @@
-from typing import TypedDict, List, Optional, Dict, Any
+from typing import Annotated, TypedDict, List, Optional, Dict, Any
 import pandas as pd
 
+from src.orchestrator.budget import RunBudget
+from src.orchestrator.speculation import CreativeSpeculation
+
+def merge_batches(current: List[Dict[str, Any]], update: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Reducer for fanned-out insight branches: appends new batches. Nodes that
+    return the whole state hand back the batches already stored, which are skipped.
+    """
+    return current + [batch for batch in update if not any(batch is seen for seen in current)]
+
 class AgentState(TypedDict):
     """
     Defines the state that flows through the agentic graph.
     """
+    # Unique ID for this run (keys the event log)
+    run_id: str
+
     # Original query from the user
     user_query: str 
     
@@ -17,6 +30,17 @@ class AgentState(TypedDict):
     # Summarized data or specific data cuts for analysis
     data_summary: Optional[str] 
     
+    # The data summary split into an "overview" plus one section per insight group
+    summary_sections: Dict[str, str]
+
+    # One insight call per segment group, fanned out in parallel
+    # Format: {"group": "...", "data_summary": "..."}
+    insight_tasks: List[Dict[str, Any]]
+
+    # Per-branch insight results, merged by the reduce step
+    # Format: {"group": "...", "hypotheses": [], "error": None}
+    hypothesis_batches: Annotated[List[Dict[str, Any]], merge_batches]
+
     # List of hypotheses generated by the Insight Agent
     # Format: {"hypothesis": "...", "confidence": 0.0, "evidence": "..."}
     hypotheses: List[Dict[str, Any]]
@@ -26,10 +50,32 @@ class AgentState(TypedDict):
     
     # IDs or names of low-CTR campaigns to focus on
     low_ctr_campaigns: List[str]
+
+    # Still-running creatives whose CTR decay is accelerating
+    # Format: {"creative_type": "...", "creative_message": "...", "campaigns": [], "recent_decay_rate": 0.0, ...}
+    fatigued_creatives: List[Dict[str, Any]]
     
+    # Actual vs. expected (trend + day-of-week baseline) for the current window, per dimension
+    # Format: {"campaign_name": DataFrame indexed by segment with <kpi>_actual/_expected/_residual/_z}
+    baselines: Dict[str, pd.DataFrame]
+
+    # Whether creative generation may retry campaigns emptied by the near-duplicate
+    # filter (turned off by the orchestrator when the budget cannot cover a second call)
+    creative_retry: bool
+
     # Generated creative recommendations
     # Format: {"campaign_name": "...", "new_headlines": [], "new_messages": []}
     creative_recommendations: List[Dict[str, Any]]
     
     # For reflection and retry logic
-    log: List[str]
\ No newline at end of file
+    log: List[str]
+
+    # Per-run latency/token budget (None = unlimited)
+    budget: Optional[RunBudget]
+
+    # Budget-driven degradation decisions taken by the orchestrator
+    # Format: {"node": "...", "decision": "...", "reason": "..."}
+    degradations: List[Dict[str, Any]]
+
+    # In-flight speculative creative generation (opt-in), if any
+    speculation: Optional[CreativeSpeculation]
\ No newline at end of file
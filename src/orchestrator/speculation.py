@@ -0,0 +1,108 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+
+class CreativeSpeculation:
+    """
+    Creative generation started as soon as the low-CTR campaigns are known,
+    running in a background thread while insights are generated and evaluated.
+    The outcome (used, refined or discarded) is written to the run log together
+    with the critical-path time it saved or the work it wasted.
+    """
+
+    def __init__(self, generate: Callable, insights: str, campaigns: List[str],
+                 df: pd.DataFrame, run_logger, run_id: Optional[str]):
+        self.campaigns = list(campaigns)
+        self.run_logger = run_logger
+        self.run_id = run_id
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.waited_s = 0.0
+        self.resolved = False
+
+        # Run in a copy of the caller's context, so the LLM calls inherit the run's
+        # callbacks (including the budget's token meter) like any other node's calls
+        context = contextvars.copy_context()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculative-creatives")
+        self.future = executor.submit(context.run, self._run, generate, insights, self.campaigns, df)
+        executor.shutdown(wait=False)
+
+    def _run(self, generate: Callable, insights: str, campaigns: List[str], df: pd.DataFrame):
+        try:
+            return generate(insights, campaigns, df)
+        finally:
+            self.finished = time.perf_counter()
+
+    @property
+    def duration_s(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def collect(self, campaigns: List[str], timeout: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Waits (up to `timeout` seconds) for the speculative result.
+        Returns the recommendations for `campaigns`, or None if the speculation
+        failed or did not finish in time (it is then discarded). The caller
+        resolves a returned result with `mark_used` or `mark_refined`.
+        """
+        wait_start = time.perf_counter()
+        try:
+            recommendations = self.future.result(timeout=timeout)
+        except Exception as e:
+            self.discard(f"speculative generation unavailable: {e!r}")
+            return None
+        self.waited_s = time.perf_counter() - wait_start
+
+        # The orchestrator may have shrunk the campaign list since launch
+        if set(campaigns) != set(self.campaigns):
+            recommendations = [r for r in recommendations if r["campaign_name"] in campaigns]
+        return recommendations
+
+    def mark_used(self):
+        """Records that the speculative result replaced the creative LLM call."""
+        self._resolve(
+            "used",
+            saved_s=round(max(self.duration_s - self.waited_s, 0.0), 3),
+            waited_s=round(self.waited_s, 3),
+            wasted_s=0.0,
+        )
+
+    def mark_refined(self, refine_s: float):
+        """Records that the speculative result was regenerated with the validated insights."""
+        self._resolve(
+            "refined",
+            saved_s=0.0,
+            waited_s=round(self.waited_s, 3),
+            wasted_s=round(self.duration_s, 3),
+            refine_s=round(refine_s, 3),
+        )
+
+    def discard(self, reason: str):
+        """
+        Drops the speculative result. A call already in flight cannot be stopped
+        (and the process waits for it on exit), so the outcome is logged once
+        it actually finishes, with its full duration as wasted time.
+        """
+        if self.resolved:
+            return
+        self.resolved = True
+        if self.future.cancel():
+            self._log("discarded", reason=reason, saved_s=0.0, wasted_s=0.0)
+            return
+        self.future.add_done_callback(
+            lambda _: self._log("discarded", reason=reason, saved_s=0.0, wasted_s=round(self.duration_s, 3))
+        )
+
+    def _resolve(self, outcome: str, **fields):
+        self.resolved = True
+        self._log(outcome, **fields)
+
+    def _log(self, outcome: str, **fields):
+        print(f"Orchestrator: Speculative creatives {outcome} ({fields}).")
+        self.run_logger.log_event(
+            self.run_id, "generate_creatives", "speculation",
+            outcome=outcome, speculation_s=round(self.duration_s, 3), **fields
+        )
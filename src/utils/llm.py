@@ -16,19 +16,65 @@
 
 
 import os
+import threading
+from typing import Dict, Optional, Tuple
 # from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
 
 from dotenv import load_dotenv
 
-def get_llm(model_name: str, temperature: float):
-    """Initializes and returns the ChatOpenAI model."""
-    load_dotenv()
-    if not os.getenv("GOOGLE_API_KEY"):
-        raise EnvironmentError("GOOGLE_API_KEY not found in .env file.")
-        
-    return ChatGoogleGenerativeAI(
-        model=model_name,
-        temperature=temperature,
-        max_retries=2,
-    )
\ No newline at end of file
+# Client pool keyed by (model, temperature, base_url, transport). All pooled
+# clients are shallow copies of one owner per endpoint, so they share its
+# provider client, HTTP session / gRPC channel and keep-alive connections.
+_POOL: Dict[Tuple[str, float, Optional[str], Optional[str]], ChatGoogleGenerativeAI] = {}
+_OWNERS: Dict[Tuple[Optional[str], Optional[str]], ChatGoogleGenerativeAI] = {}
+_LOCK = threading.Lock()
+_ENV_LOADED = False
+
+def get_llm(model_name: str, temperature: float, base_url: Optional[str] = None,
+            transport: Optional[str] = None):
+    """
+    Returns the pooled ChatGoogleGenerativeAI model for (model, temperature) on this endpoint.
+    `base_url` / `transport` point every client at another endpoint, e.g. a
+    local stand-in server with transport="rest".
+    """
+    global _ENV_LOADED
+    with _LOCK:
+        endpoint = (base_url, transport)
+        key = (model_name, temperature, *endpoint)
+        if key in _POOL:
+            return _POOL[key]
+
+        if not _ENV_LOADED:
+            load_dotenv()
+            _ENV_LOADED = True
+        if not os.getenv("GOOGLE_API_KEY"):
+            raise EnvironmentError("GOOGLE_API_KEY not found in .env file.")
+
+        if endpoint not in _OWNERS:
+            _OWNERS[endpoint] = ChatGoogleGenerativeAI(
+                model=model_name,
+                temperature=temperature,
+                max_retries=2,
+                transport=transport,
+                client_options={"api_endpoint": base_url} if base_url else None,
+            )
+            llm = _OWNERS[endpoint]
+        else:
+            # model_copy skips validation, so the owner's client is reused as-is
+            llm = _OWNERS[endpoint].model_copy(update={
+                "model": model_name if model_name.startswith("models/") else f"models/{model_name}",
+                "temperature": temperature,
+            })
+        _POOL[key] = llm
+        return llm
+
+def get_llm_from_config(config: dict, temperature: Optional[float] = None):
+    """Pooled client for the configured model (and endpoint), at `temperature` or the configured one."""
+    llm_cfg = config["llm"]
+    return get_llm(
+        model_name=llm_cfg["model_name"],
+        temperature=llm_cfg["temperature"] if temperature is None else temperature,
+        base_url=llm_cfg.get("base_url"),
+        transport=llm_cfg.get("transport"),
+    )
@@ -0,0 +1,132 @@
+import cProfile
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+# pstats function key: (filename, line number, function name)
+Func = Tuple[str, int, str]
+
+
+class NodeProfiler:
+    """
+    Profiles graph nodes with cProfile and tracemalloc (the --profile mode).
+    Each node execution writes to `out_dir`:
+      - <node>.pstats          raw cProfile stats (open with pstats / snakeviz)
+      - <node>.collapsed.txt   collapsed stacks rooted at the node, for flamegraph.pl / speedscope
+      - <node>.alloc.txt       top-N allocation sites (net bytes allocated during the node)
+    Nodes are only wrapped when profiling is enabled, so there is no cost otherwise.
+    One node is profiled at a time: cProfile allows a single active profiler per
+    process (Python 3.12+) and tracemalloc is process-wide, so a node that starts
+    while another is being profiled (e.g. a concurrent insight branch) runs unprofiled.
+    """
+
+    def __init__(self, out_dir: str, top_n: int = 25):
+        self.out_dir = out_dir
+        self.top_n = top_n
+        self._runs: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+        os.makedirs(out_dir, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def wrap(self, name: str, fn: Callable) -> Callable:
+        def profiled(*args, **kwargs):
+            if not self._active.acquire(blocking=False):
+                print(f"Profiler: '{name}' not profiled (another node is being profiled concurrently).")
+                return fn(*args, **kwargs)
+            try:
+                before = tracemalloc.take_snapshot()
+                tracemalloc.reset_peak()
+                profile = cProfile.Profile()
+                started = time.perf_counter()
+                try:
+                    profile.enable()
+                except ValueError as e:  # Another profiling tool (debugger, coverage) is active
+                    print(f"Profiler: '{name}' not profiled ({e}).")
+                    return fn(*args, **kwargs)
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    profile.disable()
+                    elapsed = time.perf_counter() - started
+                    _, peak = tracemalloc.get_traced_memory()
+                    after = tracemalloc.take_snapshot()
+                    # Hide tracemalloc's own bookkeeping from the allocation report
+                    own = [tracemalloc.Filter(False, tracemalloc.__file__)]
+                    alloc_diff = after.filter_traces(own).compare_to(before.filter_traces(own), 'lineno')
+                    self._write(name, profile, alloc_diff, elapsed, peak)
+            finally:
+                self._active.release()
+
+        return profiled
+
+    def _write(self, name: str, profile: cProfile.Profile, alloc_diff: list, elapsed: float, peak: int):
+        with self._lock:
+            self._runs[name] = self._runs.get(name, 0) + 1
+            run = self._runs[name]
+        stem = os.path.join(self.out_dir, name if run == 1 else f"{name}-{run}")
+
+        profile.dump_stats(f"{stem}.pstats")
+        stats = pstats.Stats(profile).stats
+        with open(f"{stem}.collapsed.txt", "w") as f:
+            for stack, micros in collapse_stacks(stats, root=name):
+                f.write(f"{stack} {micros}\n")
+
+        with open(f"{stem}.alloc.txt", "w") as f:
+            f.write(f"# {name}: {elapsed:.3f}s wall, peak traced memory {peak / 1024 / 1024:.1f} MiB\n")
+            f.write("# Memory is traced process-wide: the peak and allocations include any other\n"
+                    "# threads running meanwhile (e.g. speculative creative generation)\n")
+            f.write(f"# Top {self.top_n} allocation sites by net bytes allocated during the node\n")
+            for stat in sorted(alloc_diff, key=lambda s: s.size_diff, reverse=True)[:self.top_n]:
+                frame = stat.traceback[0]
+                f.write(
+                    f"{stat.size_diff / 1024:>10.1f} KiB {stat.count_diff:>8} blocks  "
+                    f"{frame.filename}:{frame.lineno}\n"
+                )
+        print(f"Profiler: '{name}' took {elapsed:.3f}s (peak {peak / 1024 / 1024:.1f} MiB) -> {stem}.*")
+
+
+def _label(func: Func) -> str:
+    filename, lineno, funcname = func
+    if filename == "~":  # Built-in
+        return funcname.replace(";", ",")
+    return f"{funcname} ({os.path.basename(filename)}:{lineno})".replace(";", ",")
+
+
+def collapse_stacks(stats: dict, root: str, max_depth: int = 64) -> List[Tuple[str, int]]:
+    """
+    Reconstructs collapsed stacks ("a;b;c <microseconds>") from cProfile's
+    caller/callee graph. cProfile only keeps caller->callee edges, so a
+    function's time is split across its callers in proportion to each
+    edge's cumulative time.
+    """
+    children: Dict[Func, List[Tuple[Func, float]]] = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, (_, _, _, edge_ct) in callers.items():
+            children.setdefault(caller, []).append((func, edge_ct))
+    roots = [
+        func for func, (_, _, _, _, callers) in stats.items()
+        if not any(caller in stats for caller in callers)
+    ]
+
+    stacks: Dict[str, float] = {}
+
+    def visit(func: Func, weight: float, path: List[str], seen: frozenset):
+        _, _, tottime, cumtime, _ = stats[func]
+        if cumtime <= 0 or weight < 1e-6 or len(path) > max_depth:
+            return
+        path = path + [_label(func)]
+        key = ";".join(path)
+        stacks[key] = stacks.get(key, 0.0) + weight * min(tottime / cumtime, 1.0)
+        for child, edge_ct in children.get(func, []):
+            if child not in seen:
+                visit(child, weight * edge_ct / cumtime, path, seen | {child})
+
+    for func in roots:
+        visit(func, stats[func][3], [root], frozenset([func]))
+
+    return [(stack, int(seconds * 1e6)) for stack, seconds in stacks.items() if seconds * 1e6 >= 1]
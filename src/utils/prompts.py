@@ -0,0 +1,33 @@
+import os
+import threading
+from typing import Dict
+
+from langchain_core.prompts import ChatPromptTemplate
+
+# Compiled templates keyed by file path, parsed once per process
+_TEMPLATES: Dict[str, ChatPromptTemplate] = {}
+_LOCK = threading.Lock()
+
+def get_prompt(config: dict, filename: str) -> ChatPromptTemplate:
+    """Returns the compiled prompt template for `filename` in the prompts directory."""
+    path = f"{config['paths']['prompts']}{filename}"
+    with _LOCK:
+        if path not in _TEMPLATES:
+            _TEMPLATES[path] = ChatPromptTemplate.from_template(_load_prompt_template(path))
+        return _TEMPLATES[path]
+
+def preload_prompts(config: dict):
+    """Reads and compiles every prompt template up front."""
+    prompt_dir = config["paths"]["prompts"]
+    for filename in sorted(os.listdir(prompt_dir)):
+        if filename.endswith(".md"):
+            get_prompt(config, filename)
+
+def _load_prompt_template(path: str) -> str:
+    """Helper to load prompt templates from files."""
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except FileNotFoundError:
+        print(f"Error: Prompt file not found at {path}")
+        return ""
@@ -0,0 +1,162 @@
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder
+    orjson = None
+
+
+def _dumps(record: Dict[str, Any]) -> bytes:
+    """Encodes a record as one compact JSON line."""
+    if orjson is not None:
+        return orjson.dumps(record, default=str, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+
+
+class RunLogger:
+    """
+    Append-only JSONL event log.
+    Each call to `log_event` writes a single compact record; the active
+    segment is rotated (and gzip-compressed) once it exceeds `max_bytes`
+    or is older than `max_age_hours`. History is never re-read on write,
+    so the cost per event is constant regardless of how many runs exist.
+    Safe to share between threads (e.g. concurrent insight branches): writes
+    and rotation are serialized by a lock.
+    """
+
+    def __init__(self, log_dir: str, filename: str = "events.jsonl",
+                 max_bytes: int = 10_000_000, max_age_hours: float = 24.0,
+                 max_segments: int = 50):
+        self.log_dir = log_dir
+        self.path = os.path.join(log_dir, filename)
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_hours * 3600 if max_age_hours else None
+        self.max_segments = max_segments
+        os.makedirs(log_dir, exist_ok=True)
+        self._file = None
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RunLogger":
+        log_cfg = config.get("logging", {})
+        return cls(
+            config["paths"]["logs"],
+            filename=log_cfg.get("event_log", "events.jsonl"),
+            max_bytes=log_cfg.get("max_bytes", 10_000_000),
+            max_age_hours=log_cfg.get("max_age_hours", 24.0),
+            max_segments=log_cfg.get("max_segments", 50),
+        )
+
+    def log_event(self, run_id: str, node: str, event: str, **fields: Any) -> None:
+        """Appends one event record to the active segment."""
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "run_id": run_id,
+            "node": node,
+            "event": event,
+        }
+        record.update(fields)
+        line = _dumps(record)
+        with self._lock:
+            f = self._open()
+            f.write(line)
+            f.flush()
+            if self._needs_rotation(f):
+                self._rotate()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "ab")
+            self._opened_at = self._segment_start()
+        return self._file
+
+    def _segment_start(self) -> float:
+        """Timestamp of the first record in the active segment (reads one line)."""
+        try:
+            with open(self.path, "rb") as f:
+                first = f.readline()
+            return datetime.fromisoformat(json.loads(first)["ts"]).timestamp()
+        except (OSError, ValueError, KeyError):
+            return time.time()
+
+    def _needs_rotation(self, f) -> bool:
+        if f.tell() >= self.max_bytes:
+            return True
+        return self.max_age_s is not None and time.time() - self._opened_at >= self.max_age_s
+
+    def _rotate(self) -> None:
+        """Compresses the active segment and starts a new one (caller holds the lock)."""
+        self._close()
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        base, _ = os.path.splitext(self.path)
+        rotated = f"{base}-{stamp}.jsonl.gz"
+        with open(self.path, "rb") as src, gzip.open(rotated, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(self.path)
+
+        segments = _rotated_segments(self.path)
+        for old in segments[:-self.max_segments] if self.max_segments else []:
+            os.remove(old)
+
+
+def _rotated_segments(path: str) -> list:
+    base, _ = os.path.splitext(path)
+    return sorted(glob.glob(f"{base}-*.jsonl.gz"))
+
+
+_LOGGERS: Dict[str, RunLogger] = {}
+
+
+def get_run_logger(config: dict) -> RunLogger:
+    """Returns the shared RunLogger for the configured log directory."""
+    key = os.path.join(config["paths"]["logs"], config.get("logging", {}).get("event_log", "events.jsonl"))
+    if key not in _LOGGERS:
+        _LOGGERS[key] = RunLogger.from_config(config)
+    return _LOGGERS[key]
+
+
+def read_events(log_dir: str, filename: str = "events.jsonl",
+                run_id: Optional[str] = None, node: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yields events from rotated and active segments in chronological order,
+    optionally filtered by run ID and/or node name.
+    """
+    path = os.path.join(log_dir, filename)
+    sources = _rotated_segments(path)
+    if os.path.exists(path):
+        sources.append(path)
+
+    for source in sources:
+        opener = gzip.open if source.endswith(".gz") else open
+        with opener(source, "rb") as f:
+            for line in f:
+                # Cheap substring pre-filter before decoding
+                if run_id is not None and run_id.encode() not in line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Truncated line from an interrupted write
+                if run_id is not None and record.get("run_id") != run_id:
+                    continue
+                if node is not None and record.get("node") != node:
+                    continue
+                yield record
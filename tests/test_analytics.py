@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+from src.analytics.baseline import fit_baselines
+from src.analytics.contribution import decompose_change
+from src.analytics.fatigue import fit_fatigue_curves
+from src.analytics.near_duplicates import MinHashLSH, load_or_build_index
+
+
+def _creative_days(message, daily_ctr, start='2025-01-01'):
+    days = len(daily_ctr)
+    return pd.DataFrame({
+        'creative_type': 'Image',
+        'creative_message': message,
+        'date': pd.date_range(start, periods=days),
+        'clicks': np.round(np.array(daily_ctr) * 100000),
+        'impressions': 100000.0,
+    })
+
+
+def test_fatigue_flags_only_accelerating_decay():
+    age = np.arange(20)
+    steady = 0.02 * np.exp(-0.01 * age)
+    # Flat for two weeks, then losing ~10% CTR per day
+    accelerating = 0.02 * np.exp(-0.10 * np.clip(age - 13, 0, None))
+    daily = pd.concat([
+        _creative_days('Steady decay', steady),
+        _creative_days('Falls off a cliff', accelerating, start='2025-01-05'),
+        _creative_days('Too new', accelerating[-4:]),
+    ])
+
+    curves = fit_fatigue_curves(daily).set_index('creative_message')
+
+    assert curves.loc['Falls off a cliff', 'accelerating']
+    assert not curves.loc['Steady decay', 'accelerating']
+    assert not curves.loc['Too new', 'accelerating']
+    assert abs(curves.loc['Steady decay', 'decay_rate'] - (1 - np.exp(-0.01))) < 1e-3
+    assert curves.loc['Falls off a cliff', 'recent_decay_rate'] > 0.05
+    assert curves.index[0] == 'Falls off a cliff'
+
+
+def test_fatigue_is_not_driven_by_one_low_volume_zero_click_day():
+    steady = _creative_days('Steady', np.full(20, 0.02))
+    steady.loc[17, ['clicks', 'impressions']] = [0.0, 20000.0]  # Tracking gap on a small day
+
+    curves = fit_fatigue_curves(steady)
+
+    assert not curves.loc[0, 'accelerating']
+    assert abs(curves.loc[0, 'recent_decay_rate']) < 0.1  # Unweighted: 21%/day
+
+
+def test_fatigue_false_positive_rate_is_near_nominal_on_noise():
+    # Constant CTR per creative, binomial clicks: nothing is fatiguing
+    rng = np.random.default_rng(7)
+    n_creatives, days = 5000, 30
+    impressions = rng.integers(5000, 100000, size=(n_creatives, days))
+    clicks = rng.binomial(impressions, rng.uniform(0.005, 0.03, size=(n_creatives, 1)))
+    daily = pd.DataFrame({
+        'creative_type': 'Image',
+        'creative_message': np.repeat(np.arange(n_creatives).astype(str), days),
+        'date': np.tile(pd.date_range('2025-01-01', periods=days).to_numpy(), n_creatives),
+        'clicks': clicks.ravel().astype(float),
+        'impressions': impressions.ravel().astype(float),
+    })
+
+    curves = fit_fatigue_curves(daily, acceleration_margin=0.0)
+
+    # One-sided z = 3 is 0.13%; a normal threshold on 7-point slopes flagged ~1.5%
+    assert curves['accelerating'].mean() < 0.004
+
+
+def test_near_duplicate_index_rejects_copies_and_persists(tmp_path):
+    history = [f"Breathable organic cotton briefs, style {i}, in a new colourway" for i in range(500)]
+    history.append("No ride-up guarantee: best-selling men briefs back in stock.")
+    index = load_or_build_index(history, str(tmp_path))
+    assert len(list(tmp_path.glob("creative_lsh-*.npz"))) == 1
+
+    keep, rejected = index.filter([
+        "NO RIDE-UP GUARANTEE - best-selling men briefs back in stock!",  # restyled copy of history
+        "Seamless waistband you forget you're wearing",                   # new
+        "A seamless waistband you forget you're wearing",                 # near-copy of the previous candidate
+    ], threshold=0.7)
+
+    assert keep == [False, True, False]
+    assert rejected[0]['similar_to'] == history[-1]
+    assert rejected[1]['similar_to'] == "Seamless waistband you forget you're wearing"
+    # The persisted index reads back identical to the one that was built
+    reloaded = MinHashLSH().load(str(next(tmp_path.glob("creative_lsh-*.npz"))))
+    assert np.array_equal(reloaded.signatures, index.signatures)
+    assert reloaded.query(history[3]) == (1.0, history[3])
+
+
+def test_roas_change_splits_into_mix_and_rate():
+    comparison = pd.DataFrame({
+        'spend_previous':   [100.0, 100.0, 0.0],
+        'spend_current':    [50.0, 100.0, 50.0],
+        'revenue_previous': [400.0, 200.0, 0.0],
+        'revenue_current':  [200.0, 100.0, 50.0],
+    }, index=['Steady', 'Worse', 'New'])
+
+    effects = decompose_change(comparison, 'roas')
+
+    overall_change = 350 / 200 - 600 / 200
+    assert abs(effects['total_effect'].sum() - overall_change) < 1e-12
+    # 'Steady' keeps its ROAS: only its lost spend share moves the total
+    assert effects.loc['Steady', 'rate_effect'] == 0
+    assert effects.loc['Steady', 'mix_effect'] < 0
+    # 'Worse' halves its ROAS at a similar share: mostly a rate effect
+    assert effects.loc['Worse', 'rate_effect'] < 0
+    # A segment entering the mix is a pure mix effect
+    assert effects.loc['New', 'rate_effect'] == 0
+    assert effects.loc['New', 'mix_effect'] < 0
+    assert effects.index[0] == 'Worse'
+
+
+def test_baseline_separates_weekday_pattern_from_real_drops():
+    rng = np.random.default_rng(7)
+    dates = pd.date_range('2025-01-06', periods=42)  # Six full weeks starting on a Monday
+    weekend = dates.dayofweek >= 5
+    ctr = np.where(weekend, 0.01, 0.02) * (1 + 0.02 * rng.standard_normal((2, len(dates))))
+    ctr[1, -7:] *= 0.7  # 'Dropping' loses 30% CTR in the current window
+    daily = pd.concat([
+        pd.DataFrame({
+            'campaign_name': name, 'date': dates,
+            'impressions': 100000.0, 'clicks': ctr[i] * 100000,
+            'spend': 100.0, 'revenue': 300.0 * (1 + 0.02 * rng.standard_normal(len(dates))),
+        })
+        for i, name in enumerate(['Seasonal', 'Dropping'])
+    ])
+    current = (dates[-7], dates[-1])
+
+    baselines = fit_baselines(daily, ['campaign_name'], current).set_index('campaign_name')
+
+    assert baselines.loc['Seasonal', 'history_days'] == 35
+    assert abs(baselines.loc['Seasonal', 'ctr_z']) < 3
+    assert abs(baselines.loc['Seasonal', 'ctr_expected'] / baselines.loc['Seasonal', 'ctr_actual'] - 1) < 0.02
+    assert baselines.loc['Dropping', 'ctr_z'] < -10
+    assert abs(baselines.loc['Dropping', 'ctr_residual'] / baselines.loc['Dropping', 'ctr_expected'] + 0.3) < 0.03
@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+from src.agents.data_agent import DataAgent
+from src.analytics.backend import BASE_COLUMNS, DuckDBBackend, PandasBackend, pivot_periods, period_windows
+
+pytest.importorskip("duckdb")
+
+DATA_PATHS = ["data/sample_fb_ads.csv", "data/synthetic_fb_ads_undergarments.csv"]
+
+
+def _pandas_backend(path):
+    config = {
+        "paths": {"sample_data": path},
+        "system": {"use_sample_data": True},
+        "analysis": {},
+    }
+    state = DataAgent(config).load_data_node({"log": [], "full_data": None})
+    return PandasBackend(state["full_data"])
+
+
+def _sorted(frame, keys):
+    return frame.sort_values(keys).reset_index(drop=True)
+
+
+@pytest.fixture(params=DATA_PATHS)
+def backends(request):
+    return _pandas_backend(request.param), DuckDBBackend(request.param)
+
+
+@pytest.mark.parametrize("dimensions", [[], ["campaign_name"], ["audience_type", "platform"]])
+def test_period_totals_match_pandas(backends, dimensions):
+    pandas_backend, duck = backends
+    assert pandas_backend.max_date() == duck.max_date()
+    periods = period_windows(pandas_backend.max_date(), 7)
+
+    keys = dimensions + ["period"]
+    expected = _sorted(pandas_backend.period_totals(dimensions, periods), keys)
+    actual = _sorted(duck.period_totals(dimensions, periods), keys)
+
+    assert expected[keys].astype(str).equals(actual[keys].astype(str))
+    pd.testing.assert_frame_equal(
+        expected[BASE_COLUMNS].astype(float), actual[BASE_COLUMNS].astype(float), check_exact=False
+    )
+
+
+def test_pivoted_kpis_match_pandas(backends):
+    pandas_backend, duck = backends
+    periods = period_windows(pandas_backend.max_date(), 14)
+    expected = pivot_periods(pandas_backend.period_totals(["campaign_name"], periods), ["campaign_name"], list(periods))
+    actual = pivot_periods(duck.period_totals(["campaign_name"], periods), ["campaign_name"], list(periods))
+    pd.testing.assert_frame_equal(
+        expected.sort_index().astype(float), actual.sort_index().astype(float), check_exact=False
+    )
+
+
+def test_distinct_with_filter_matches_pandas(backends):
+    pandas_backend, duck = backends
+    campaigns = pandas_backend.distinct(["campaign_name"])["campaign_name"].tolist()[:2]
+    columns = ["campaign_name", "creative_message"]
+    expected = _sorted(pandas_backend.distinct(columns, {"campaign_name": campaigns}), columns)
+    actual = _sorted(duck.distinct(columns, {"campaign_name": campaigns}), columns)
+    pd.testing.assert_frame_equal(expected, actual)
+
+
+def test_export_without_kpi_columns_matches_pandas(tmp_path):
+    path = str(tmp_path / "no_kpis.csv")
+    pd.read_csv(DATA_PATHS[0]).drop(columns=["roas", "ctr"]).to_csv(path, index=False)
+    pandas_backend, duck = _pandas_backend(path), DuckDBBackend(path)
+    periods = period_windows(pandas_backend.max_date(), 7)
+
+    expected = pivot_periods(pandas_backend.period_totals(["campaign_name"], periods), ["campaign_name"], list(periods))
+    actual = pivot_periods(duck.period_totals(["campaign_name"], periods), ["campaign_name"], list(periods))
+    pd.testing.assert_frame_equal(
+        expected.sort_index().astype(float), actual.sort_index().astype(float), check_exact=False
+    )
+    assert duck._execute("SELECT MAX(roas) > 0 AND MAX(ctr) > 0 FROM ads").fetchone()[0]
@@ -0,0 +1,136 @@
+import pytest
+
+from src.orchestrator.budget import RunBudget
+from src.orchestrator.graph import DEFAULT_PLAN, _enforce_budget, _store_cached_plan
+from src.utils.run_log import RunLogger, read_events
+
+
+def _budget(tokens_left: int) -> RunBudget:
+    """Token-only budget with `tokens_left` remaining (calls cost 1000, campaigns 100)."""
+    budget = RunBudget(max_tokens=10_000, est_call_tokens=1000, est_campaign_tokens=100,
+                       degraded_max_hypotheses=2, degraded_creative_top_n=1)
+    budget.callback.total_tokens = 10_000 - tokens_left
+    return budget
+
+
+def _state(budget: RunBudget, **fields) -> dict:
+    state = {"run_id": "run-1", "user_query": "Why did ROAS drop?", "plan": [], "hypotheses": [],
+             "insight_tasks": [], "low_ctr_campaigns": [], "log": [], "degradations": [], "budget": budget}
+    state.update(fields)
+    return state
+
+
+@pytest.fixture
+def run(tmp_path):
+    """Runs one node through the budget policy; returns (state, node ran, degrade events)."""
+    # The near-duplicate retry is off unless a test turns it on
+    config = {"paths": {"cache": str(tmp_path / "cache")}, "analysis": {"creative_dedup": {"regenerate": False}}}
+    logger = RunLogger(str(tmp_path / "logs"))
+
+    def run_node(name, state, config=config):
+        calls = []
+        result = _enforce_budget(name, lambda s: calls.append(s) or s, config, logger)(state)
+        logger.close()
+        events = [e["decision"] for e in read_events(str(tmp_path / "logs"), node=name) if e["event"] == "degrade"]
+        return result, bool(calls), events
+
+    run_node.config = config
+    return run_node
+
+
+def test_can_afford_counts_calls_and_extra_tokens():
+    budget = _budget(2500)
+    assert budget.can_afford(2) and not budget.can_afford(3)
+    assert budget.can_afford(2, 500) and not budget.can_afford(2, 501)
+    assert RunBudget().can_afford(100) and not RunBudget().exhausted()
+
+
+def test_planner_serves_default_plan_without_a_cached_one(run):
+    state, ran, events = run("planner", _state(_budget(2000)))
+
+    assert not ran and state["plan"] == DEFAULT_PLAN
+    assert events == ["serve_default_plan"]
+
+
+def test_planner_serves_cached_plan(run):
+    _store_cached_plan(run.config, "Why did ROAS drop?", ["Load.", "Summarize."])
+
+    state, ran, events = run("planner", _state(_budget(2000)))
+
+    assert not ran and state["plan"] == ["Load.", "Summarize."]
+    assert events == ["serve_cached_plan"]
+
+
+def test_planner_counts_tokens_for_every_insight_branch(run):
+    # 3 sequential calls fit, but not with 3 more insight branches (4 groups by default)
+    _, ran, events = run("planner", _state(_budget(5000)))
+    assert not ran and events == ["serve_default_plan"]
+
+    config = dict(run.config, analysis={"insights": {"groups": {"campaigns": ["campaign_name"]}}})
+    _, ran, _ = run("planner", _state(_budget(5000)), config)
+    assert ran
+
+
+GROUPS = ["campaigns", "audiences", "platforms", "creatives"]
+
+
+def test_insight_fan_out_capped_to_the_branches_the_tokens_cover(run):
+    tasks = [{"group": g, "data_summary": "..."} for g in GROUPS]
+
+    state, ran, events = run("generate_insights", _state(_budget(4000), insight_tasks=list(tasks)))
+    assert ran and state["insight_tasks"] == tasks and events == []
+
+    state, ran, events = run("generate_insights", _state(_budget(2500), insight_tasks=list(tasks)))
+    assert [t["group"] for t in state["insight_tasks"]] == ["campaigns", "audiences"]
+    assert events == ["cap_insight_groups_2"]
+
+
+def test_insights_skipped_when_no_branch_fits(run):
+    tasks = [{"group": g, "data_summary": "..."} for g in GROUPS]
+
+    state, ran, events = run("generate_insights", _state(_budget(999), insight_tasks=list(tasks),
+                                                          hypotheses=[{"hypothesis": "x"}]))
+    assert state["insight_tasks"] == [] and state["hypotheses"] == [] and events == ["skip_insights"]
+    assert state["degradations"][0]["reason"].endswith("cannot cover 4 LLM call(s)")
+
+    state, ran, _ = run("generate_insights", _state(_budget(0), insight_tasks=list(tasks)))
+    assert not ran and state["insight_tasks"] == []
+
+
+def test_evaluation_caps_hypotheses_by_confidence(run):
+    hypotheses = [{"hypothesis": h, "confidence": c} for h, c in [("a", 0.2), ("b", 0.9), ("c", 0.5)]]
+
+    state, ran, events = run("evaluate_insights", _state(_budget(500), hypotheses=hypotheses))
+
+    assert ran and [h["hypothesis"] for h in state["hypotheses"]] == ["b", "c"]
+    assert events == ["cap_hypotheses_2"]
+
+
+def test_creatives_shrink_when_only_the_full_campaign_list_does_not_fit(run):
+    campaigns = ["A", "B", "C"]
+
+    # 1000 + 3 * 100 fits
+    state, ran, events = run("generate_creatives", _state(_budget(1300), low_ctr_campaigns=list(campaigns)))
+    assert ran and state["low_ctr_campaigns"] == campaigns and events == []
+
+    # Only 1000 + 1 * 100 fits
+    state, ran, events = run("generate_creatives", _state(_budget(1200), low_ctr_campaigns=list(campaigns)))
+    assert ran and state["low_ctr_campaigns"] == ["A"] and events == ["shrink_creatives_1"]
+
+
+def test_creatives_skipped_when_one_campaign_does_not_fit(run):
+    state, ran, events = run("generate_creatives", _state(_budget(1099), low_ctr_campaigns=["A", "B"]))
+
+    assert not ran and state["degradations"][0]["decision"] == "skip_creatives"
+    assert events == ["skip_creatives"]
+
+
+def test_creative_retry_dropped_when_a_second_call_does_not_fit(run):
+    config = dict(run.config, analysis={"creative_dedup": {"regenerate": True}})
+
+    # 2 * (1000 + 2 * 100) fits
+    state, ran, events = run("generate_creatives", _state(_budget(2400), low_ctr_campaigns=["A", "B"]), config)
+    assert ran and "creative_retry" not in state and events == []
+
+    state, ran, events = run("generate_creatives", _state(_budget(2399), low_ctr_campaigns=["A", "B"]), config)
+    assert ran and state["creative_retry"] is False and events == ["no_creative_retry"]
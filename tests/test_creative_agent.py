@@ -0,0 +1,68 @@
+import pandas as pd
+from langchain_core.runnables import RunnableLambda
+
+from src.agents import creative_agent
+
+EXISTING = "No ride-up guarantee: best-selling men briefs back in stock."
+HISTORY = pd.DataFrame({
+    "campaign_name": ["A", "B"],
+    "creative_message": [EXISTING, "Cooling mesh panels for workouts."],
+    "ctr": [0.01, 0.02],
+})
+
+
+def _set(campaign, headlines, messages):
+    return {"campaign_name": campaign, "new_headlines": headlines, "new_messages": messages, "new_ctas": ["Shop now"]}
+
+
+def _generator(monkeypatch, tmp_path, responses):
+    """Creative generator whose LLM returns `responses` in turn; records the campaigns of each call."""
+    calls = []
+
+    class FakeLLM:
+        def with_structured_output(self, schema):
+            def call(prompt):
+                calls.append(prompt.to_string().split("**Low-CTR Campaigns to Fix:**\n")[1].split("\n")[0])
+                return schema(recommendations=responses.pop(0))
+            return RunnableLambda(call)
+
+    monkeypatch.setattr(creative_agent, "get_llm_from_config", lambda *a, **k: FakeLLM())
+    config = {"llm": {}, "paths": {"prompts": "prompts/", "cache": str(tmp_path)}, "analysis": {}}
+    return creative_agent.get_creative_generator(config), calls
+
+
+def test_campaign_without_headlines_or_messages_is_regenerated(monkeypatch, tmp_path):
+    generate, calls = _generator(monkeypatch, tmp_path, [
+        [_set("A", ["Comfort that lasts all day"], ["NO RIDE-UP GUARANTEE - best-selling men briefs back in stock!"]),
+         _set("B", ["Breathe through every rep"], ["Mesh zones keep you cool from warm-up to cool-down."])],
+        [_set("A", ["Comfort that lasts all day"], ["A waistband so soft you forget it is there."])],
+    ])
+
+    recommendations = generate("insights", ["A", "B"], HISTORY)
+
+    assert calls == ["['A', 'B']", "['A']"]
+    assert [r["campaign_name"] for r in recommendations] == ["A", "B"]
+    assert recommendations[0]["new_messages"] == ["A waistband so soft you forget it is there."]
+
+
+def test_sets_still_incomplete_after_the_retry_are_dropped(monkeypatch, tmp_path):
+    copy = _set("B", ["Breathe through every rep"], ["Mesh zones keep you cool from warm-up to cool-down."])
+    generate, calls = _generator(monkeypatch, tmp_path, [
+        [_set("A", [], ["A waistband so soft you forget it is there."]), copy],
+        [_set("A", ["Breathe through every rep!"], ["Mesh zones keep you cool from warm-up to cool-down"])],
+    ])
+
+    recommendations = generate("insights", ["A", "B"], HISTORY)
+
+    # The retry copied B's kept copy, so it is the retry that is rejected and A is dropped
+    assert calls == ["['A', 'B']", "['A']"]
+    assert recommendations == [copy]
+
+
+def test_retry_can_be_turned_off(monkeypatch, tmp_path):
+    generate, calls = _generator(monkeypatch, tmp_path, [
+        [_set("A", ["Comfort that lasts all day"], [EXISTING])],
+    ])
+
+    assert generate("insights", ["A"], HISTORY, regenerate=False) == []
+    assert calls == ["['A']"]
@@ -82,4 +82,90 @@ def test_evaluator_rejects_hypothesis(test_config, sample_data):
     result_state = evaluator.evaluate_node(initial_state)
     
     # Assert
-    assert len(result_state["validated_insights"]) == 0
\ No newline at end of file
+    assert len(result_state["validated_insights"]) == 0
+
+# Two 7-day windows: Campaign_A's ROAS halves, Audience_X's CTR holds
+@pytest.fixture
+def period_data():
+    dates = pd.date_range('2023-01-01', periods=14)
+    rows = []
+    for i, date in enumerate(dates):
+        current = i >= 7
+        rows.append({
+            'date': date, 'campaign_name': 'Campaign_A', 'audience_type': 'Audience_X',
+            'platform': 'Facebook', 'spend': 100.0, 'revenue': 200.0 if current else 400.0,
+            'purchases': 10, 'clicks': 200, 'impressions': 10000,
+        })
+    return pd.DataFrame(rows)
+
+def _state_with(data, hypotheses):
+    return AgentState(
+        full_data=data, hypotheses=hypotheses,
+        user_query="", plan=[], data_summary=None, validated_insights=[],
+        low_ctr_campaigns=[], creative_recommendations=[], log=[]
+    )
+
+def test_evaluator_checks_structured_specs_in_one_plan(test_config, period_data):
+    evaluator = EvaluatorAgent(test_config)
+    hypotheses = [
+        {"hypothesis": "Spend efficiency fell", "confidence": 0.5, "data_needed_for_validation": "",
+         "spec": {"metric": "roas", "dimension": "campaign_name", "entity": "campaign_a",
+                  "window_days": 7, "expected_direction": "decrease"}},
+        {"hypothesis": "Clicks got cheaper", "confidence": 0.5, "data_needed_for_validation": "",
+         "spec": {"metric": "ctr", "dimension": "audience_type", "entity": "Audience_X",
+                  "window_days": 7, "expected_direction": "decrease"}},
+        {"hypothesis": "Platform revenue grew", "confidence": 0.5, "data_needed_for_validation": "",
+         "spec": {"metric": "revenue", "dimension": "platform", "entity": "Facebook",
+                  "window_days": 7, "expected_direction": "increase"}},
+    ]
+
+    plan = evaluator._compile_plan([h["spec"] for h in hypotheses])
+    assert set(plan) == {("campaign_name", 7), ("audience_type", 7), ("platform", 7)}
+
+    result_state = evaluator.evaluate_node(_state_with(period_data, hypotheses))
+
+    assert [i["hypothesis"] for i in result_state["validated_insights"]] == ["Spend efficiency fell"]
+    assert "CONFIRMED" in result_state["validated_insights"][0]["evidence"]
+    assert "-50.0%" in result_state["validated_insights"][0]["evidence"]
+
+def test_evaluator_infers_spec_for_legacy_hypotheses(test_config, period_data):
+    evaluator = EvaluatorAgent(test_config)
+    hypotheses = [
+        {"hypothesis": "Campaign_A ROAS collapsed this campaign week.", "confidence": 0.5,
+         "data_needed_for_validation": ""},
+        {"hypothesis": "Weather changed.", "confidence": 0.5, "data_needed_for_validation": ""},
+    ]
+
+    result_state = evaluator.evaluate_node(_state_with(period_data, hypotheses))
+
+    assert len(result_state["validated_insights"]) == 1
+    assert hypotheses[1]["evidence"] == "No specific validation logic found for this hypothesis type."
+
+def test_evaluator_rejects_moves_within_baseline(test_config, period_data):
+    evaluator = EvaluatorAgent(test_config)
+    spec = {"metric": "roas", "dimension": "campaign_name", "entity": "Campaign_A",
+            "window_days": 7, "expected_direction": "decrease"}
+
+    for z, confirmed in [(-0.8, False), (-3.5, True)]:
+        hypotheses = [{"hypothesis": "ROAS fell", "confidence": 0.5, "data_needed_for_validation": "", "spec": spec}]
+        state = _state_with(period_data, hypotheses)
+        state["baselines"] = {"campaign_name": pd.DataFrame({"roas_z": [z]}, index=["Campaign_A"])}
+
+        result_state = evaluator.evaluate_node(state)
+
+        assert len(result_state["validated_insights"]) == int(confirmed)
+        assert f"baseline z = {z:+.1f}" in hypotheses[0]["evidence"].lower()
+
+def test_evaluator_clamps_non_positive_windows(test_config, period_data):
+    evaluator = EvaluatorAgent(test_config)
+    specs = [{"metric": "roas", "dimension": "campaign_name", "entity": "Campaign_A",
+              "window_days": days, "expected_direction": "decrease"} for days in (0, -3, None)]
+
+    assert set(evaluator._compile_plan(specs)) == {("campaign_name", 1), ("campaign_name", 7)}
+
+    hypotheses = [{"hypothesis": "ROAS fell", "confidence": 0.5, "data_needed_for_validation": "", "spec": specs[1]}]
+    result_state = evaluator.evaluate_node(_state_with(period_data, hypotheses))
+
+    # The last day against the one before it: ROAS 2.0 vs. 2.0
+    assert result_state["validated_insights"] == []
+    assert "Error" not in hypotheses[0]["evidence"]
@@ -0,0 +1,66 @@
+from langchain_core.runnables import RunnableLambda
+
+from src.agents import insight_agent
+from src.orchestrator.graph_state import merge_batches
+
+CONFIG = {"llm": {}, "paths": {"prompts": "prompts/"}, "analysis": {"insights": {"max_hypotheses": 3}}}
+
+
+def _hypo(text, confidence, entity=None):
+    spec = None
+    if entity:
+        spec = {"metric": "roas", "dimension": "campaign_name", "entity": entity,
+                "window_days": 7, "expected_direction": "decrease"}
+    return {"hypothesis": text, "confidence": confidence, "data_needed_for_validation": "", "spec": spec}
+
+
+def test_failed_branch_is_recorded_not_raised(monkeypatch):
+    class FailingLLM:
+        def with_structured_output(self, schema):
+            def call(prompt):
+                raise TimeoutError("deadline exceeded")
+            return RunnableLambda(call)
+
+    monkeypatch.setattr(insight_agent, "get_llm_from_config", lambda *a, **k: FailingLLM())
+    branch = insight_agent.get_insight_branch(CONFIG)
+
+    update = branch({"group": "audiences", "data_summary": "...", "user_query": "Why?"})
+
+    [batch] = update["hypothesis_batches"]
+    assert batch["group"] == "audiences" and batch["hypotheses"] == []
+    assert "deadline exceeded" in batch["error"]
+
+
+def test_merge_dedups_ranks_and_caps():
+    batches = [
+        {"group": "campaigns", "error": None, "hypotheses": [
+            _hypo("Campaign A lost ROAS to fatigue", 0.6, entity="Campaign A"),
+            _hypo("Budget moved to weaker campaigns", 0.5),
+        ]},
+        {"group": "audiences", "error": "TimeoutError()", "hypotheses": []},
+        {"group": "creatives", "error": None, "hypotheses": [
+            _hypo("Stale creatives dragged down campaign a", 0.8, entity="campaign a"),  # Same check as above
+            _hypo("Budget moved to weaker campaigns!", 0.4),                           # Same text as above
+            _hypo("Carousel ads stopped converting", 0.7),
+            _hypo("Video CTR decayed", 0.3),
+        ]},
+    ]
+    state = {"insight_tasks": [{"group": b["group"]} for b in batches], "hypothesis_batches": batches, "log": []}
+
+    result = insight_agent.get_insight_merger(CONFIG)(state)
+
+    assert [h["hypothesis"] for h in result["hypotheses"]] == [
+        "Stale creatives dragged down campaign a",
+        "Carousel ads stopped converting",
+        "Budget moved to weaker campaigns",
+    ]
+    assert result["log"] == ["Insight Agent: 'audiences' branch failed: TimeoutError()"]
+
+
+def test_batches_reducer_ignores_batches_already_stored():
+    stored = [{"group": "campaigns", "hypotheses": [], "error": None}]
+    new = {"group": "audiences", "hypotheses": [], "error": None}
+
+    # A node returning the whole state hands back the stored batches alongside nothing new
+    assert merge_batches(stored, stored) == stored
+    assert merge_batches(stored, [new]) == stored + [new]
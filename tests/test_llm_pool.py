@@ -0,0 +1,78 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.utils import llm as llm_module
+from src.utils.prompts import get_prompt
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """Local stand-in for the generateContent endpoint; records connections and request bodies."""
+    protocol_version = "HTTP/1.1"
+    connections = set()
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        type(self).connections.add(self.client_address)
+        type(self).requests.append((self.path, body))
+        out = json.dumps({
+            "candidates": [{"content": {"parts": [{"text": "ok"}], "role": "model"}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": 3, "candidatesTokenCount": 1, "totalTokenCount": 4},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.setattr(llm_module, "_POOL", {})
+    monkeypatch.setattr(llm_module, "_OWNERS", {})
+    _StandIn.connections, _StandIn.requests = set(), []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_pooled_clients_share_one_connection(stand_in):
+    config = {"llm": {"model_name": "gemini-test", "temperature": 0.1, "base_url": stand_in, "transport": "rest"}}
+
+    analyst = llm_module.get_llm_from_config(config)
+    creative = llm_module.get_llm_from_config(config, temperature=0.7)
+    assert llm_module.get_llm_from_config(config) is analyst
+    assert creative is not analyst and creative.client is analyst.client
+
+    for model in (analyst, creative, analyst):
+        assert model.invoke("ping").content == "ok"
+
+    assert len(_StandIn.connections) == 1
+    temperatures = [body["generationConfig"]["temperature"] for _, body in _StandIn.requests]
+    assert temperatures == pytest.approx([0.1, 0.7, 0.1])
+    assert all("/models/gemini-test:generateContent" in path for path, _ in _StandIn.requests)
+
+
+def test_prompts_are_compiled_once():
+    config = {"paths": {"prompts": "prompts/"}}
+    assert get_prompt(config, "insight_prompt.md") is get_prompt(config, "insight_prompt.md")
+
+
+def test_pool_is_keyed_by_endpoint(stand_in):
+    config = {"llm": {"model_name": "gemini-test", "temperature": 0.1, "base_url": stand_in, "transport": "rest"}}
+    other = {"llm": dict(config["llm"], base_url="http://127.0.0.1:9")}
+
+    local = llm_module.get_llm_from_config(config)
+    elsewhere = llm_module.get_llm_from_config(other)
+
+    assert elsewhere is not local and elsewhere.client is not local.client
+    assert local.invoke("ping").content == "ok"
+    assert len(_StandIn.requests) == 1
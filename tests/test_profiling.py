@@ -0,0 +1,26 @@
+import threading
+
+from src.utils.profiling import NodeProfiler
+
+
+def test_concurrent_nodes_run_with_one_profiled(tmp_path):
+    profiler = NodeProfiler(str(tmp_path))
+    inside = threading.Barrier(2, timeout=5)
+
+    def branch(state):
+        inside.wait()  # Both branches are running at once
+        return {"group": state["group"]}
+
+    node = profiler.wrap("insight_branch", branch)
+    results = {}
+    threads = [threading.Thread(target=lambda g=g: results.update({g: node({"group": g})})) for g in "ab"]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == {"a": {"group": "a"}, "b": {"group": "b"}}
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "insight_branch.alloc.txt", "insight_branch.collapsed.txt", "insight_branch.pstats"
+    ]
+    assert "process-wide" in (tmp_path / "insight_branch.alloc.txt").read_text()
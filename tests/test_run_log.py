@@ -0,0 +1,51 @@
+import glob
+import os
+import threading
+
+from src.utils.run_log import RunLogger, read_events
+
+
+def test_events_are_appended_and_queryable(tmp_path):
+    logger = RunLogger(str(tmp_path))
+    logger.log_event("run-1", "planner", "end", duration_ms=12.5)
+    logger.log_event("run-1", "load_data", "end", n_rows=200)
+    logger.log_event("run-2", "planner", "end", duration_ms=8.0)
+    logger.close()
+
+    assert len(list(read_events(str(tmp_path)))) == 3
+    run_1 = list(read_events(str(tmp_path), run_id="run-1"))
+    assert [e["node"] for e in run_1] == ["planner", "load_data"]
+    planner = list(read_events(str(tmp_path), node="planner"))
+    assert [e["run_id"] for e in planner] == ["run-1", "run-2"]
+
+
+def test_rotation_compresses_segments_without_losing_events(tmp_path):
+    logger = RunLogger(str(tmp_path), max_bytes=200, max_segments=0)
+    for i in range(20):
+        logger.log_event(f"run-{i}", "summarize_data", "end", duration_ms=float(i))
+    logger.close()
+
+    assert glob.glob(os.path.join(str(tmp_path), "events-*.jsonl.gz"))
+    events = list(read_events(str(tmp_path)))
+    assert [e["run_id"] for e in events] == [f"run-{i}" for i in range(20)]
+    assert list(read_events(str(tmp_path), run_id="run-7"))[0]["duration_ms"] == 7.0
+
+
+def test_concurrent_writers_rotate_without_losing_or_duplicating_events(tmp_path):
+    logger = RunLogger(str(tmp_path), max_bytes=2000, max_segments=0)
+
+    def write(thread):
+        for i in range(300):
+            logger.log_event(f"run-{thread}", "insight_branch", "end", seq=i)
+
+    threads = [threading.Thread(target=write, args=(t,)) for t in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    logger.close()
+
+    events = list(read_events(str(tmp_path)))
+    assert len(events) == 1200
+    for thread in range(4):
+        assert [e["seq"] for e in events if e["run_id"] == f"run-{thread}"] == list(range(300))
@@ -0,0 +1,99 @@
+import threading
+import time
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+
+from src.orchestrator.budget import RunBudget, TokenUsageCallback
+from src.orchestrator.graph import _enforce_budget, _speculate
+from src.orchestrator.speculation import CreativeSpeculation
+from src.utils.run_log import RunLogger, read_events
+
+RECOMMENDATIONS = [{"campaign_name": "A", "new_headlines": ["h"], "new_messages": ["m"], "new_ctas": ["c"]},
+                   {"campaign_name": "B", "new_headlines": ["h"], "new_messages": ["m"], "new_ctas": ["c"]}]
+
+
+def _outcomes(log_dir):
+    return [e for e in read_events(log_dir) if e["event"] == "speculation"]
+
+
+def test_used_result_is_filtered_to_the_current_campaigns(tmp_path):
+    logger = RunLogger(str(tmp_path))
+    speculation = CreativeSpeculation(lambda *a: RECOMMENDATIONS, "summary", ["A", "B"], None, logger, "run-1")
+
+    recommendations = speculation.collect(["B"], timeout=5)
+    speculation.mark_used()
+
+    assert [r["campaign_name"] for r in recommendations] == ["B"]
+    [event] = _outcomes(str(tmp_path))
+    assert event["outcome"] == "used" and event["wasted_s"] == 0.0
+
+
+def test_refined_result_counts_as_wasted(tmp_path):
+    logger = RunLogger(str(tmp_path))
+    speculation = CreativeSpeculation(lambda *a: RECOMMENDATIONS, "summary", ["A", "B"], None, logger, "run-1")
+
+    assert speculation.collect(["A", "B"], timeout=5) == RECOMMENDATIONS
+    speculation.mark_refined(0.25)
+
+    [event] = _outcomes(str(tmp_path))
+    assert event["outcome"] == "refined" and event["saved_s"] == 0.0 and event["refine_s"] == 0.25
+
+
+def test_discarded_call_is_logged_when_it_finishes(tmp_path):
+    logger = RunLogger(str(tmp_path))
+    release = threading.Event()
+
+    def slow_generate(*args):
+        release.wait(5)
+        time.sleep(0.2)
+        return RECOMMENDATIONS
+
+    speculation = CreativeSpeculation(slow_generate, "summary", ["A"], None, logger, "run-1")
+    speculation.discard("no validated insights")
+    assert _outcomes(str(tmp_path)) == []  # Still running
+
+    release.set()
+    speculation.future.result(timeout=5)
+    deadline = time.time() + 5
+    while not _outcomes(str(tmp_path)) and time.time() < deadline:
+        time.sleep(0.01)
+
+    [event] = _outcomes(str(tmp_path))
+    assert event["outcome"] == "discarded" and event["reason"] == "no validated insights"
+    assert event["wasted_s"] >= 0.2
+
+
+def test_speculative_calls_reach_the_run_callbacks(tmp_path):
+    logger = RunLogger(str(tmp_path))
+    meter = TokenUsageCallback()
+    llm = FakeListChatModel(responses=["creatives"])
+
+    def node(_):
+        # Launched from inside a node, like the orchestrator does after summarize_data
+        speculation = CreativeSpeculation(lambda *a: llm.invoke("prompt"), "summary", ["A"], None, logger, "run-1")
+        return speculation.future.result(timeout=5)
+
+    RunnableLambda(node).invoke({}, config={"callbacks": [meter]})
+
+    assert meter.calls == 1
+
+
+def test_refine_the_budget_cannot_cover_uses_the_speculative_result(tmp_path):
+    logger = RunLogger(str(tmp_path))
+    config = {"paths": {}, "orchestration": {"speculative_refine": True},
+              "analysis": {"creative_dedup": {"regenerate": False}}}
+    # Covers a bare call (1000) but not one with a campaign (1000 + 100)
+    budget = RunBudget(max_tokens=1050, est_call_tokens=1000, est_campaign_tokens=100)
+    refined = []
+    node = _enforce_budget("generate_creatives", lambda s: refined.append(s) or s, config, logger)
+    node = _speculate("generate_creatives", node, config, logger, generate=None)
+    speculation = CreativeSpeculation(lambda *a: RECOMMENDATIONS, "summary", ["A", "B"], None, logger, "run-1")
+    state = {"run_id": "run-1", "low_ctr_campaigns": ["A", "B"], "creative_recommendations": [],
+             "log": [], "degradations": [], "budget": budget, "speculation": speculation}
+
+    state = node(state)
+
+    assert not refined and state["creative_recommendations"] == RECOMMENDATIONS
+    assert state["degradations"] == []
+    assert [e["outcome"] for e in _outcomes(str(tmp_path))] == ["used"]